@@ -47,6 +47,7 @@ class Settings(BaseSettings):
     # Document Processing
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    PDF_TEXT_BACKEND: str = "pypdfium2"  # pypdfium2 or pdfplumber
     
     # RAG
     TOP_K_RESULTS: int = 5
@@ -12,6 +12,10 @@ from app.models.document import Document  # noqa: F401
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add indexes introduced since then
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("Database tables created successfully!")
 
 
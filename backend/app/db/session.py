@@ -2,10 +2,17 @@
 Database session management
 """
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+engine_options = {}
+if make_url(settings.DATABASE_URL).get_dialect().driver == "psycopg2":
+    # Send executemany of text() statements (not eligible for insertmanyvalues) as
+    # psycopg2 execute_batch pages instead of one round-trip per parameter set
+    engine_options["executemany_mode"] = "values_plus_batch"
+
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, **engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -1,7 +1,7 @@
 """
 Transaction database models (Capital Calls, Distributions, Adjustments)
 """
-from sqlalchemy import Column, Integer, String, Date, Numeric, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Numeric, Boolean, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
@@ -11,6 +11,10 @@ class CapitalCall(Base):
     """Capital Call model"""
     
     __tablename__ = "capital_calls"
+    # Covers the per-fund SUM(amount) and date-ordered cash flow reads as index-only scans
+    __table_args__ = (
+        Index("ix_capital_calls_fund_date", "fund_id", "call_date", postgresql_include=["amount"]),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     fund_id = Column(Integer, ForeignKey("funds.id"), nullable=False)
@@ -28,6 +32,9 @@ class Distribution(Base):
     """Distribution model"""
     
     __tablename__ = "distributions"
+    __table_args__ = (
+        Index("ix_distributions_fund_date", "fund_id", "distribution_date", postgresql_include=["amount"]),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     fund_id = Column(Integer, ForeignKey("funds.id"), nullable=False)
@@ -46,6 +53,13 @@ class Adjustment(Base):
     """Adjustment model"""
     
     __tablename__ = "adjustments"
+    # adjustment_type second, so the NAV_ADJUSTMENT sum is a range of the index too
+    __table_args__ = (
+        Index(
+            "ix_adjustments_fund_type", "fund_id", "adjustment_type", "adjustment_date",
+            postgresql_include=["amount"]
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     fund_id = Column(Integer, ForeignKey("funds.id"), nullable=False)
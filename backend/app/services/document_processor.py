@@ -1,13 +1,104 @@
 import re
-from typing import Dict, List, Optional
+import os
+import asyncio
+import io
+import struct
+import functools
+import hashlib
+import itertools
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime
+import numpy as np
 import pdfplumber
+import pypdfium2 as pdfium
 from sqlalchemy.orm import Session
 from sqlalchemy import text as sql_text
+from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns (compiled once at import instead of on every parse call)
+# Fund info labels, found together in one scan of the text (labels never overlap)
+_FUND_INFO_LABEL_RE = re.compile(
+    r"(?P<name>Fund Name:)|(?P<gp_name>GP:)|(?P<vintage_year>Vintage Year:)",
+    re.IGNORECASE
+)
+# Field values, matched right after their label
+_FUND_INFO_VALUE_RES = {
+    'name': re.compile(r"\s*(.+)"),
+    'gp_name': re.compile(r"\s*(.+)"),
+    'vintage_year': re.compile(r"\s*(\d{4})"),
+}
+_AMOUNT_CLEAN_RE = re.compile(r"[^\d.-]")
+# Deletes every Latin-1 character except digits, '.' and '-' (the common case for amounts)
+_AMOUNT_DELETE_TABLE = str.maketrans("", "", "".join(
+    ch for ch in map(chr, range(256)) if ch not in "0123456789.-"
+))
+_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+# Section landmarks, found together in a single pass: the transaction section headers
+# (title + column header line) and the bare headings that can end a section.
+# Compiled with re, not RE2: RE2's \s is ASCII-only (it misses the \xa0 and \x0b PDF text
+# often has between words) and RE2 rejects text containing lone surrogates. The pattern is
+# literal alternatives joined by \s+, so re scans it in linear time anyway
+_SECTION_LANDMARK_RE = re.compile(
+    r'(?P<capital_calls>Capital Calls\s+Date Call Number Amount Description\s+)'
+    r'|(?P<distributions>Distributions\s+Date Type Amount Recallable Description\s+)'
+    r'|(?P<adjustments>Adjustments\s+Date Type Amount Description\s+)'
+    r'|(?P<heading>Distributions|Adjustments|Performance Summary|Fund Strategy)',
+    re.IGNORECASE
+)
+# Headings (lowercase) that end each section
+_SECTION_END_HEADINGS = {
+    'capital_calls': frozenset({'distributions', 'adjustments', 'performance summary'}),
+    'distributions': frozenset({'adjustments', 'performance summary'}),
+    'adjustments': frozenset({'performance summary', 'fund strategy'}),
+}
+# Lowercase section titles, used as a cheap str.find prefilter before the regex scan
+_SECTION_TITLES = ('capital calls', 'distributions', 'adjustments')
+# Upper bound on how far past its header a section body is scanned
+MAX_SECTION_CHARS = 200_000
+
+# Row patterns, matched against the text that follows each date (see _iter_dated_rows),
+# so they need no lookahead for the next row
+# Pattern: Call X $X,XXX,XXX Description text
+_CALL_ROW_RE = re.compile(r'\s++(Call\s++\d++)\s++\$?([\d,]++)\s+(.+)', re.DOTALL)
+# The type is matched as whole words with possessive quantifiers, so a long whitespace run
+# can only be split one way (a [\w\s]+? type between two \s+ backtracks cubically on it)
+# Pattern: Type $X,XXX,XXX Yes/No Description
+_DIST_ROW_RE = re.compile(
+    r'\s++(\w++(?:\s++\w++)*?)\s++\$?([\d,]++)\s++(Yes|No)\s+(.+)',
+    re.DOTALL | re.IGNORECASE
+)
+# Pattern: Type $X,XXX,XXX or -$X,XXX,XXX Description
+_ADJ_ROW_RE = re.compile(
+    r'\s++(\w++(?:\s++\w++)*?)\s++(-?\$?[\d,]++)\s+(.+)',
+    re.DOTALL | re.IGNORECASE
+)
+
+# Section header patterns for parse_table_generic, keyed by section name
+_TABLE_SECTION_RES: Dict[str, re.Pattern] = {}
+# Whatever ends a parse_table_generic section body (the end of text also does)
+_TABLE_SECTION_END_RE = re.compile(
+    r'\n[A-Z][a-z]+\s+[A-Z]|Performance Summary|Fund Strategy|Key Definitions',
+    re.IGNORECASE
+)
+
+
+def _table_section_re(section_name: str) -> re.Pattern:
+    """Return the compiled section header pattern for a section name, compiling it on first use"""
+    pattern = _TABLE_SECTION_RES.get(section_name)
+    if pattern is None:
+        pattern = re.compile(rf"{section_name}\s+", re.IGNORECASE)
+        _TABLE_SECTION_RES[section_name] = pattern
+    return pattern
+
 # Parsers with Error Handling
 def parse_fund_info(text: str) -> Dict:
     """
@@ -20,54 +111,73 @@ def parse_fund_info(text: str) -> Dict:
         'vintage_year': None
     }
     
-    # find fund name
-    try:
-        name_match = re.search(r"Fund Name:\s*(.+)", text, re.IGNORECASE)
-        if name_match:
-            fund_info['name'] = name_match.group(1).strip()
-    except Exception as e:
-        logger.warning(f"Failed to parse fund name: {e}")
-    
-    # find GP name
-    try:
-        gp_match = re.search(r"GP:\s*(.+)", text, re.IGNORECASE)
-        if gp_match:
-            fund_info['gp_name'] = gp_match.group(1).strip()
-    except Exception as e:
-        logger.warning(f"Failed to parse GP: {e}")
-    
-    # find vintage year (4 digits)
-    try:
-        year_match = re.search(r"Vintage Year:\s*(\d{4})", text, re.IGNORECASE)
-        if year_match:
-            fund_info['vintage_year'] = int(year_match.group(1))
-    except Exception as e:
-        logger.warning(f"Failed to parse vintage year: {e}")
+    # find the first occurrence of each field in a single scan
+    found = {}
+    for label in _FUND_INFO_LABEL_RE.finditer(text):
+        field = label.lastgroup
+        if field in found:
+            continue
+        # a label without a valid value is skipped, like a failed search would
+        value = _FUND_INFO_VALUE_RES[field].match(text, label.end())
+        if value:
+            found[field] = value.group(1)
+            if len(found) == len(fund_info):
+                break
+    
+    # fund name and GP name
+    for field in ('name', 'gp_name'):
+        if field in found:
+            fund_info[field] = found[field].strip()
+    
+    # vintage year (4 digits)
+    if 'vintage_year' in found:
+        try:
+            fund_info['vintage_year'] = int(found['vintage_year'])
+        except ValueError as e:
+            logger.warning(f"Failed to parse vintage year: {e}")
     
     # return parsed fund info
     return fund_info
 
+# Supported date formats; the separators differ, so the order never changes the result
+_DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+    "%d-%m-%Y",
+    "%B %d, %Y",
+    "%b %d, %Y",
+    "%Y/%m/%d"
+)
+# Format that parsed the previous date, tried first since a document uses one format throughout
+_last_date_fmt = _DATE_FORMATS[0]
+
+@functools.lru_cache(maxsize=4096)
 def parse_date(date_str: str) -> Optional[datetime]:
     """
     Parse a date string using multiple common formats.
     Returns a datetime object if successful, otherwise None.
+    Results are cached, as the same dates repeat across a document's rows.
     """
-    date_formats = [
-        "%Y-%m-%d",
-        "%m/%d/%Y",
-        "%d-%m-%Y",
-        "%B %d, %Y",
-        "%b %d, %Y",
-        "%Y/%m/%d"
-    ]
-    
-    # try parsing with the current format
-    for fmt in date_formats:
+    global _last_date_fmt
+    date_str = date_str.strip()
+    
+    # fast path for YYYY-MM-DD, the shape every section regex extracts; the shape check keeps
+    # other ISO forms fromisoformat accepts (e.g. 20240321) from parsing when they did not before
+    if len(date_str) == 10 and date_str[4] == date_str[7] == "-":
         try:
-            return datetime.strptime(date_str.strip(), fmt)
+            return datetime.fromisoformat(date_str)
+        except ValueError:
+            pass
+    
+    # try the last successful format first, then the rest
+    for fmt in (_last_date_fmt, *_DATE_FORMATS):
+        try:
+            parsed = datetime.strptime(date_str, fmt)
         except ValueError:
             # if fails, continue to next format
             continue
+        _last_date_fmt = fmt
+        return parsed
     
     # log warning if no format matched
     logger.warning(f"Could not parse date: {date_str}")
@@ -77,7 +187,10 @@ def parse_amount(amount_str: str) -> Optional[float]:
     """Extract numeric value from amount string"""
     try:
         # Remove currency symbols, commas, spaces
-        cleaned = re.sub(r"[^\d.-]", "", amount_str)
+        cleaned = amount_str.translate(_AMOUNT_DELETE_TABLE)
+        if not cleaned.isascii():
+            # characters beyond Latin-1 are left by the table; fall back to the regex
+            cleaned = _AMOUNT_CLEAN_RE.sub("", cleaned)
         return float(cleaned) if cleaned else None
     except Exception as e:
         logger.warning(f"Could not parse amount: {amount_str} - {e}")
@@ -85,85 +198,138 @@ def parse_amount(amount_str: str) -> Optional[float]:
 
 def parse_table_generic(text: str, section_name: str) -> List[List[str]]:
     """Generic table parser that handles both formatted and inline tables"""
-    rows = []
-    
     #Find section and extract content until next section
-    section_pattern = rf"{section_name}\s+(.*?)(?=\n[A-Z][a-z]+\s+[A-Z]|Performance Summary|Fund Strategy|Key Definitions|\Z)"
-    match = re.search(section_pattern, text, re.DOTALL | re.IGNORECASE)
+    match = _table_section_re(section_name).search(text)
     
     if not match:
         logger.warning(f"Could not find section: {section_name}")
         return []
     
-    content = match.group(1).strip()
+    # Slice up to the first end marker instead of growing a lazy DOTALL match
+    # and testing the end lookahead at every character
+    end = _TABLE_SECTION_END_RE.search(text, match.end())
+    content = text[match.end():end.start() if end else len(text)].strip()
     logger.debug(f"Section content for {section_name}:\n{content[:200]}...")
     
     # Split by date patterns (YYYY-MM-DD format)
     # This handles inline tables where all data is in one line
-    date_pattern = r'(\d{4}-\d{2}-\d{2})'
-    
     # Split content by dates to get individual rows
-    parts = re.split(date_pattern, content)
-    
-    # Reconstruct rows: parts are [before_date, date1, after_date1, date2, after_date2, ...]
-    i = 1  # Start from first date
-    while i < len(parts):
-        if i + 1 < len(parts):
-            date_str = parts[i]
-            row_data = parts[i + 1].strip()
-            
-            # Extract columns from row_data
-            # Remove extra spaces and split
-            row_data = re.sub(r'\s+', ' ', row_data)
-            
-            # Create row starting with date
-            row = [date_str]
-            
-            # Add remaining data
-            remaining = row_data.split(' ', 3)  # Split into max 4 parts
-            row.extend(remaining)
-            
-            rows.append(row)
-            logger.debug(f"Parsed row: {row}")
-        
-        i += 2
-    
+    return _reconstruct_rows(_DATE_RE.split(content))
+
+def _reconstruct_rows(parts: List[str]) -> List[List[str]]:
+    """
+    Rebuild table rows from date-split content.
+    parts are [before_date, date1, after_date1, date2, after_date2, ...]; each row is
+    the date followed by up to 4 whitespace-separated fields, the last holding the rest.
+    """
+    rows = []
+    for date_str, row_data in zip(parts[1::2], parts[2::2]):
+        # Split into max 4 parts on any whitespace run, then collapse the
+        # whitespace inside the trailing field (same as collapsing before splitting)
+        fields = row_data.split(None, 3) or ['']
+        if len(fields) == 4:
+            fields[3] = ' '.join(fields[3].split())
+        row = [date_str, *fields]
+        rows.append(row)
+        logger.debug(f"Parsed row: {row}")
     return rows
 
+def _iter_dated_rows(content: str):
+    """
+    Yield (date, row_text) pairs by splitting section content on its YYYY-MM-DD dates.
+    Each row runs up to the next date, which replaces the backtracking
+    `(.+?)(?=date|end)` lookahead over the whole section.
+    """
+    parts = _DATE_RE.split(content)
+    return zip(parts[1::2], parts[2::2])
+
+def split_sections(text: str) -> Dict[str, str]:
+    """
+    Locate the Capital Calls, Distributions and Adjustments sections in one pass
+    over the section landmarks.
+    Returns a dict mapping 'capital_calls' / 'distributions' / 'adjustments' to the
+    stripped section body; sections that are not present are omitted.
+    """
+    sections = {}
+    # Literal prefilter: skip the regex scan entirely when no section title occurs,
+    # and otherwise start it at the first title
+    lowered = text.lower()
+    starts = [idx for idx in map(lowered.find, _SECTION_TITLES) if idx >= 0]
+    if not starts:
+        return sections
+    # lower() can change the length of some non-ASCII text; positions only line up otherwise
+    start = min(starts) if len(lowered) == len(text) else 0
+    # Body start offset of each section whose end heading has not been seen yet
+    open_sections = {}
+    
+    def close(name: str, end: int) -> None:
+        body_start = open_sections.pop(name)
+        limit = body_start + MAX_SECTION_CHARS
+        if end > limit:
+            # Sections are bounded by MAX_SECTION_CHARS past their header. Cut at the last
+            # row start (a date) at or before the limit, so no partial row is parsed
+            row_starts = [
+                match.start() for match in _DATE_RE.finditer(text, body_start, min(end, limit + 10))
+                if match.start() <= limit
+            ]
+            end = row_starts[-1] if row_starts else body_start
+            logger.warning(
+                f"Section '{name}' exceeds {MAX_SECTION_CHARS} characters; "
+                f"rows past character {end - body_start} were dropped"
+            )
+        sections[name] = text[body_start:end].strip()
+    
+    for landmark in _SECTION_LANDMARK_RE.finditer(text, start):
+        kind = landmark.lastgroup
+        if kind == 'heading':
+            heading = landmark.group().lower()
+            ending = [name for name in open_sections if heading in _SECTION_END_HEADINGS[name]]
+        else:
+            # Another section's header ends a section whatever order the report uses;
+            # a repeated header of the same section (e.g. on the next page) does not
+            ending = [name for name in open_sections if name != kind]
+        for name in ending:
+            close(name, landmark.start())
+        if kind != 'heading' and kind not in sections and kind not in open_sections:
+            # Only the first header of each section is used
+            open_sections[kind] = landmark.end()
+        if len(sections) == len(_SECTION_END_HEADINGS):
+            break
+    
+    # Sections with no end heading run to the end of the text
+    for name in list(open_sections):
+        close(name, len(text))
+    return sections
+
 def parse_capital_calls(text: str) -> List[Dict]:
     """
     Parse the 'Capital Calls' section from PDF text.
     Extracts each capital call entry including date, call number, amount, and description.
     Returns a list of dictionaries with parsed data.
     """
-    # Look for Capital Calls section
-    pattern = r'Capital Calls\s+Date Call Number Amount Description\s+(.*?)(?=Distributions|Adjustments|Performance Summary|\Z)'
-    match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-    
+    return parse_capital_call_rows(split_sections(text).get('capital_calls'))
+
+def parse_capital_call_rows(content: Optional[str]) -> List[Dict]:
+    """Parse capital call entries from the body of the 'Capital Calls' section"""
     # If section not found, log warning and return empty list
-    if not match:
+    if content is None:
         logger.warning("Could not find Capital Calls section")
         return []
     
-    # Extract content of the Capital Calls section
-    content = match.group(1).strip()
     logger.info(f"Capital Calls content: {content[:300]}")
     
     result = []
     
-    # Pattern: YYYY-MM-DD Call X $X,XXX,XXX Description text
-    call_pattern = r'(\d{4}-\d{2}-\d{2})\s+(Call\s+\d+)\s+\$?([\d,]+)\s+(.+?)(?=\d{4}-\d{2}-\d{2}|\Z)'
-    
-    # Find all matches in the content
-    matches = re.finditer(call_pattern, content, re.DOTALL)
-    
-    # Loop through each match and extract data fields
-    for match in matches:
+    # Loop through each dated row and extract data fields
+    for date_str, row in _iter_dated_rows(content):
+        match = _CALL_ROW_RE.match(row)
+        if not match:
+            continue
         try:
-            call_date = parse_date(match.group(1))
-            call_type = match.group(2).strip()
-            amount = parse_amount(match.group(3))
-            description = match.group(4).strip()
+            call_date = parse_date(date_str)
+            call_type = match.group(1).strip()
+            amount = parse_amount(match.group(2))
+            description = match.group(3).strip()
             
             # Add to result if date and amount are valid
             if call_date and amount:
@@ -185,35 +351,30 @@ def parse_distributions(text: str) -> List[Dict]:
     Extracts each distribution entry including date, type, amount, recallable flag, and description.
     Returns a list of dictionaries with parsed data.
     """
-    # Look for Distributions section
-    pattern = r'Distributions\s+Date Type Amount Recallable Description\s+(.*?)(?=Adjustments|Performance Summary|\Z)'
-    match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-    
+    return parse_distribution_rows(split_sections(text).get('distributions'))
+
+def parse_distribution_rows(content: Optional[str]) -> List[Dict]:
+    """Parse distribution entries from the body of the 'Distributions' section"""
     # If section not found, log warning and return empty list
-    if not match:
+    if content is None:
         logger.warning("Could not find Distributions section")
         return []
     
-    # Extract content of the section
-    content = match.group(1).strip()
     logger.info(f"Distributions content: {content[:300]}")
     
     result = []
     
-    # Pattern: YYYY-MM-DD Type $X,XXX,XXX Yes/No Description
-    dist_pattern = r'(\d{4}-\d{2}-\d{2})\s+([\w\s]+?)\s+\$?([\d,]+)\s+(Yes|No)\s+(.+?)(?=\d{4}-\d{2}-\d{2}|\Z)'
-    
-    # Find all matching distribution entries
-    matches = re.finditer(dist_pattern, content, re.DOTALL | re.IGNORECASE)
-    
-    # Loop through each match and parse fields
-    for match in matches:
+    # Loop through each dated row and parse fields
+    for date_str, row in _iter_dated_rows(content):
+        match = _DIST_ROW_RE.match(row)
+        if not match:
+            continue
         try:
-            dist_date = parse_date(match.group(1))
-            dist_type = match.group(2).strip()
-            amount = parse_amount(match.group(3))
-            is_recallable = match.group(4).strip().lower() == 'yes'
-            description = match.group(5).strip()
+            dist_date = parse_date(date_str)
+            dist_type = match.group(1).strip()
+            amount = parse_amount(match.group(2))
+            is_recallable = match.group(3).strip().lower() == 'yes'
+            description = match.group(4).strip()
             
             # Add to results if date and amount are valid
             if dist_date and amount:
@@ -237,34 +398,29 @@ def parse_adjustments(text: str) -> List[Dict]:
     Extracts each adjustment entry including date, type, amount (can be negative), and description.
     Returns a list of dictionaries with parsed data.
     """
-    # Look for Adjustments section
-    pattern = r'Adjustments\s+Date Type Amount Description\s+(.*?)(?=Performance Summary|Fund Strategy|\Z)'
-    match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-    
+    return parse_adjustment_rows(split_sections(text).get('adjustments'))
+
+def parse_adjustment_rows(content: Optional[str]) -> List[Dict]:
+    """Parse adjustment entries from the body of the 'Adjustments' section"""
     # If section not found, log warning and return empty list
-    if not match:
+    if content is None:
         logger.warning("Could not find Adjustments section")
         return []
     
-    # Extract section content
-    content = match.group(1).strip()
     logger.info(f"Adjustments content: {content[:300]}")
     
     result = []
     
-    # Pattern: YYYY-MM-DD Type $X,XXX,XXX or -$X,XXX,XXX Description
-    adj_pattern = r'(\d{4}-\d{2}-\d{2})\s+([\w\s]+?)\s+(-?\$?[\d,]+)\s+(.+?)(?=\d{4}-\d{2}-\d{2}|\Z)'
-    
-    # Find all matches for adjustments
-    matches = re.finditer(adj_pattern, content, re.DOTALL | re.IGNORECASE)
-    
-    # Loop through each match and extract data fields
-    for match in matches:
+    # Loop through each dated row and extract data fields
+    for date_str, row in _iter_dated_rows(content):
+        match = _ADJ_ROW_RE.match(row)
+        if not match:
+            continue
         try:
-            adj_date = parse_date(match.group(1))
-            adj_type = match.group(2).strip()
-            amount = parse_amount(match.group(3))
-            description = match.group(4).strip()
+            adj_date = parse_date(date_str)
+            adj_type = match.group(1).strip()
+            amount = parse_amount(match.group(2))
+            description = match.group(3).strip()
             
             # Add to results if valid date and amount found
             if adj_date and amount is not None: 
@@ -280,6 +436,44 @@ def parse_adjustments(text: str) -> List[Dict]:
     
     return result
 
+# Parsed transactions of recently processed texts, keyed by a digest of the text (so the
+# cache does not hold on to whole documents); retries and re-uploads of the same report
+# skip the section scan and row parsing. Least recently used entries are evicted past the limit
+PARSED_TRANSACTIONS_CACHE_SIZE = 32
+_parsed_transactions_cache: "OrderedDict[bytes, Dict[str, List[Dict]]]" = OrderedDict()
+_parsed_transactions_lock = threading.Lock()
+
+def parse_transactions(text: str) -> Dict[str, List[Dict]]:
+    """
+    Parse capital calls, distributions and adjustments from PDF text.
+    The sections are located in one pass, then each body is parsed.
+    Returns a dict keyed 'capital_calls' / 'distributions' / 'adjustments'.
+    Results are cached by text digest; callers get their own copies of the rows.
+    """
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    # process_document runs this in executor threads, so concurrent ingests can reach the
+    # cache at once; it is only touched under the lock (the get/move_to_end and
+    # insert/evict pairs are not atomic)
+    with _parsed_transactions_lock:
+        transactions = _parsed_transactions_cache.get(key)
+        if transactions is not None:
+            _parsed_transactions_cache.move_to_end(key)
+    
+    if transactions is None:
+        sections = split_sections(text)
+        transactions = {
+            'capital_calls': parse_capital_call_rows(sections.get('capital_calls')),
+            'distributions': parse_distribution_rows(sections.get('distributions')),
+            'adjustments': parse_adjustment_rows(sections.get('adjustments')),
+        }
+        with _parsed_transactions_lock:
+            _parsed_transactions_cache[key] = transactions
+            if len(_parsed_transactions_cache) > PARSED_TRANSACTIONS_CACHE_SIZE:
+                _parsed_transactions_cache.popitem(last=False)
+    
+    # Row values are immutable; copying the lists and dicts keeps the cached entry intact
+    return {kind: [dict(row) for row in rows] for kind, rows in transactions.items()}
+
 # Text Chunking
 def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
     """
@@ -292,13 +486,201 @@ def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
     Returns:
         List[str]: List of text chunks.
     """
-    words = text.split()
-    chunks = []
-    # Loop through words and group them into chunks of defined size
-    for i in range(0, len(words), chunk_size):
-        chunks.append(" ".join(words[i:i + chunk_size]))
-    # Return list of text chunks
-    return chunks
+    return list(iter_chunks(text, chunk_size))
+
+def iter_chunks(text: str, chunk_size: int = 500) -> Iterator[str]:
+    """Lazily yield the chunks chunk_text would return, one at a time"""
+    # Each match spans chunk_size words of the original text, so chunks are sliced
+    # straight out of it instead of splitting into words and re-joining them
+    return (match.group() for match in _chunk_re(chunk_size).finditer(text))
+
+@functools.lru_cache(maxsize=8)
+def _chunk_re(chunk_size: int) -> re.Pattern:
+    """Pattern matching up to chunk_size whitespace-separated words"""
+    return re.compile(rf"\S+(?:\s+\S+){{0,{chunk_size - 1}}}")
+
+# Text Extraction
+# Documents below this page count are extracted in-process; worker start-up costs more than it saves
+PARALLEL_EXTRACTION_MIN_PAGES = 32
+# pdfplumber keeps the parsed layout of every page it has read until the file is closed,
+# so long page ranges are read by reopening the file for each window of this many pages
+PDFPLUMBER_PAGE_WINDOW = 32
+
+def _pdfium_page_text(page) -> str:
+    """Read the text layer of a single PDFium page"""
+    textpage = page.get_textpage()
+    try:
+        # Scanned/image-only pages have no characters; skip building an empty string
+        if textpage.count_chars() == 0:
+            return ""
+        # PDFium reports CRLF line breaks; normalise to match pdfplumber output
+        return textpage.get_text_range().replace("\r\n", "\n")
+    finally:
+        textpage.close()
+        page.close()
+
+def _extract_page_range(file_path: str, backend: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) with the given backend.
+    Module-level so it can be pickled into worker processes.
+    """
+    if backend == "pdfplumber":
+        page_texts = []
+        for window_start in range(start, stop, PDFPLUMBER_PAGE_WINDOW):
+            window_stop = min(window_start + PDFPLUMBER_PAGE_WINDOW, stop)
+            # pages= is 1-based
+            with pdfplumber.open(file_path, pages=list(range(window_start + 1, window_stop + 1))) as pdf:
+                page_texts.extend(page.extract_text() or "" for page in pdf.pages)
+        return page_texts
+    
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        return [_pdfium_page_text(pdf[i]) for i in range(start, stop)]
+    finally:
+        pdf.close()
+
+# Extraction workers are started once and reused: spawning a process and importing this
+# module in it costs far more than extracting a page
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_lock = threading.Lock()
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    """Return the shared extraction process pool, starting it on first use"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            # spawn avoids forking a process that may already hold server or driver threads
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extraction_pool
+
+def _extract_pages_parallel(file_path: str, backend: str, page_count: int) -> List[str]:
+    """
+    Split the page range across worker processes, each opening its own copy of the file.
+    Processes rather than threads: PDFium is not thread-safe and pdfplumber holds the GIL.
+    """
+    global _extraction_pool
+    workers = min(os.cpu_count() or 1, -(-page_count // PARALLEL_EXTRACTION_MIN_PAGES))
+    step = -(-page_count // workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    
+    pool = _get_extraction_pool()
+    try:
+        results = pool.map(
+            _extract_page_range,
+            [file_path] * len(ranges),
+            [backend] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges]
+        )
+        return [page_text for chunk in results for page_text in chunk]
+    except BrokenProcessPool:
+        # A worker died (e.g. a crash in PDFium); start a fresh pool for the next document
+        with _extraction_pool_lock:
+            if _extraction_pool is pool:
+                _extraction_pool = None
+        raise
+
+def extract_pdf_text(file_path: str) -> str:
+    """
+    Extract plain text from every page of a PDF.
+    
+    PDFium (via pypdfium2) reads the text layer directly in native code, which is
+    much cheaper than pdfplumber's layout analysis for the narrative text parsed
+    here. pdfplumber stays available through the PDF_TEXT_BACKEND setting.
+    Large documents are extracted across a process pool, in page order.
+    """
+    backend = settings.PDF_TEXT_BACKEND
+    page_texts = None
+    
+    if backend == "pdfplumber":
+        with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
+            if page_count < PARALLEL_EXTRACTION_MIN_PAGES:
+                page_texts = [page.extract_text() for page in pdf.pages]
+    else:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            page_count = len(pdf)
+            if page_count < PARALLEL_EXTRACTION_MIN_PAGES:
+                page_texts = [_pdfium_page_text(page) for page in pdf]
+        finally:
+            pdf.close()
+    
+    if page_texts is None:
+        page_texts = _extract_pages_parallel(file_path, backend, page_count)
+    
+    return "\n".join(page_text for page_text in page_texts if page_text)
+
+def _to_halfvec(embedding) -> np.ndarray:
+    """Round an embedding to float16, which is what the halfvec column stores"""
+    return np.asarray(embedding, dtype=np.float16)
+
+def _format_halfvec(embedding) -> str:
+    """
+    Format an embedding as a pgvector halfvec literal ('[x,y,...]').
+    The shortest float16 repr of each value is sent instead of a full float64 one.
+    """
+    return "[" + ",".join(map(str, _to_halfvec(embedding))) + "]"
+
+# PostgreSQL binary COPY framing: signature, flags and header extension length, and the
+# end-of-data marker
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack("!h", -1)
+
+def _pgcopy_embedding_row(
+    document_id: int, content: str, content_hash: Optional[bytes], embedding: np.ndarray
+) -> bytes:
+    """
+    Encode one (document_id, content, content_hash, embedding) tuple in binary COPY format.
+    The halfvec is sent as pgvector's binary form (int16 dim, int16 unused, big-endian
+    float16 values), so the server copies it without parsing any text.
+    A None content_hash is written as NULL (field length -1).
+    """
+    content_bytes = content.encode("utf-8")
+    vector_bytes = struct.pack("!hh", len(embedding), 0) + embedding.astype(">f2").tobytes()
+    hash_field = (
+        struct.pack("!i", -1) if content_hash is None
+        else struct.pack("!i", len(content_hash)) + content_hash
+    )
+    return b"".join((
+        struct.pack("!hii", 4, 4, document_id),
+        struct.pack("!i", len(content_bytes)), content_bytes,
+        hash_field,
+        struct.pack("!i", len(vector_bytes)), vector_bytes,
+    ))
+
+# Settings for the single ingest transaction. The rows can be rebuilt by reprocessing the
+# PDF, so COMMIT need not wait for the WAL flush; the timeouts stop a stuck ingest from
+# holding locks and blocking vacuum
+_INGEST_TRANSACTION_SETTINGS = sql_text("""
+    SET LOCAL synchronous_commit = off;
+    SET LOCAL statement_timeout = '5min';
+    SET LOCAL idle_in_transaction_session_timeout = '10min'
+""")
+
+# Chunks embedded and written per round: one embedding model batch / API request
+EMBEDDING_BATCH_SIZE = 32
+
+def _chunk_hash(model: str, chunk: str) -> bytes:
+    """
+    Hash of a chunk and the embedding model, used to reuse its stored embedding across
+    documents. The model is part of the key, so changing models never reuses old vectors
+    """
+    return hashlib.blake2b(f"{model}\0{chunk}".encode("utf-8"), digest_size=16).digest()
+
+def _embedding_model_id(embedding_func) -> Optional[str]:
+    """
+    Identity of the model behind an embedder (LangChain Embeddings expose model_name or
+    model), or None for a plain callable, whose vectors are then never stored for reuse
+    """
+    for attr in ("model_name", "model"):
+        value = getattr(embedding_func, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    return None
 
 # Document Processor
 class DocumentProcessor:
@@ -309,16 +691,120 @@ class DocumentProcessor:
     - Parses and stores fund-related data (fund info, capital calls, distributions, adjustments)
     - Updates or creates fund records in the database
     """
-    def __init__(self, db: Session, embedding_func):
+    def __init__(self, db: Session, embedding_func, embedding_model: Optional[str] = None):
         self.db = db # Database session
-        self.embedding_func = embedding_func # Function to generate text embeddings
+        self.embedding_func = embedding_func # Text -> vector callable, or a LangChain Embeddings object
+        # Model identity keying stored embeddings for reuse; None (e.g. a placeholder
+        # callable) disables reuse, so its vectors are never served for real embeddings
+        self.embedding_model = embedding_model or _embedding_model_id(embedding_func)
+
+    def _embed_chunks(self, chunks: List[str]) -> List:
+        """
+        Embed all chunks, batching when the embedder supports it.
+        LangChain Embeddings objects encode the whole list in one call (one padded
+        forward pass / API request); plain callables are invoked once per chunk.
+        """
+        embed_documents = getattr(self.embedding_func, "embed_documents", None)
+        if embed_documents is not None:
+            return embed_documents(chunks) if chunks else []
+        return [self.embedding_func(chunk) for chunk in chunks]
+
+    def _cached_embeddings(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Look up already stored embeddings for chunk content hashes in one query.
+        Returns a dict mapping each found hash to its float16 vector.
+        """
+        if not hashes:
+            return {}
+        rows = self.db.execute(
+            sql_text("""
+                SELECT DISTINCT ON (content_hash) content_hash, embedding::real[]
+                FROM document_embeddings
+                WHERE content_hash = ANY(:hashes)
+            """),
+            {"hashes": list(set(hashes))}
+        ).fetchall()
+        return {bytes(row[0]): _to_halfvec(row[1]) for row in rows}
+
+    def _save_chunk_embeddings(self, document_id: int, chunks: List[str]) -> None:
+        """Embed a batch of chunks and write them to document_embeddings"""
+        if self.embedding_model is None:
+            # Unknown model: embed everything and store no hash, so nothing reuses these rows
+            hashes = [None] * len(chunks)
+            embeddings = list(map(_to_halfvec, self._embed_chunks(chunks)))
+        else:
+            # Reuse embeddings this model already stored for identical chunks (reruns,
+            # re-uploads), and embed each remaining distinct chunk once
+            hashes = [_chunk_hash(self.embedding_model, chunk) for chunk in chunks]
+            embeddings_by_hash = self._cached_embeddings(hashes)
+            missing = {
+                content_hash: chunk
+                for content_hash, chunk in zip(hashes, chunks)
+                if content_hash not in embeddings_by_hash
+            }
+            logger.debug(f"Reusing {len(chunks) - len(missing)} stored chunk embeddings")
+            new_embeddings = self._embed_chunks(list(missing.values()))
+            embeddings_by_hash.update(zip(missing, map(_to_halfvec, new_embeddings)))
+            embeddings = [embeddings_by_hash[content_hash] for content_hash in hashes]
+        
+        # Stream rows with COPY on PostgreSQL; otherwise passing a list of parameter
+        # sets makes SQLAlchemy issue a single executemany
+        embedding_rows = [
+            {
+                "doc_id": document_id,
+                "content": chunk,
+                "content_hash": content_hash,
+                "embedding": embedding
+            }
+            for chunk, content_hash, embedding in zip(chunks, hashes, embeddings)
+        ]
+        if not self._copy_embedding_rows(embedding_rows):
+            self.db.execute(
+                sql_text("""
+                    INSERT INTO document_embeddings (document_id, content, content_hash, embedding)
+                    VALUES (:doc_id, :content, :content_hash, :embedding)
+                """),
+                [{**row, "embedding": _format_halfvec(row["embedding"])} for row in embedding_rows]
+            )
+
+    def _copy_embedding_rows(self, rows: List[Dict]) -> bool:
+        """
+        Stream embedding rows into document_embeddings with binary COPY ... FROM STDIN.
+        Vectors go over the wire as raw float16 (2 bytes per value) instead of text the
+        server has to parse. Returns False (nothing written) when the driver is not psycopg2.
+        """
+        if self.db.get_bind().dialect.driver != "psycopg2":
+            return False
+        
+        buffer = io.BytesIO()
+        buffer.write(_PGCOPY_HEADER)
+        for row in rows:
+            buffer.write(_pgcopy_embedding_row(
+                row["doc_id"], row["content"], row["content_hash"], row["embedding"]
+            ))
+        buffer.write(_PGCOPY_TRAILER)
+        buffer.seek(0)
+        
+        # Raw DBAPI connection of the session's current transaction
+        raw_conn = self.db.connection().connection
+        with raw_conn.cursor() as cursor:
+            cursor.copy_expert(
+                "COPY document_embeddings (document_id, content, content_hash, embedding) "
+                "FROM STDIN WITH (FORMAT binary)",
+                buffer
+            )
+        return True
 
     async def process_document(self, file_path: str, document_id: int, fund_id: int):
         """Extract text, parse fund data, and save structured info + embeddings"""
+        # Every blocking step (extraction, embedding, DB round-trips) runs in the default
+        # executor so one ingest does not stall other requests on the event loop. The
+        # steps are awaited one after another, so the session is never used concurrently
+        loop = asyncio.get_running_loop()
+        transactions_future = None
         try:
-            # Extract text
-            with pdfplumber.open(file_path) as pdf:
-                pdf_text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
+            # Extract text off the event loop; parsing a large PDF can take seconds
+            pdf_text = await loop.run_in_executor(None, extract_pdf_text, file_path)
 
             if not pdf_text.strip():
                 raise ValueError("PDF contains no extractable text")
@@ -326,154 +812,161 @@ class DocumentProcessor:
             logger.info(f"Extracted {len(pdf_text)} characters from PDF")
             logger.debug(f"First 1000 chars:\n{pdf_text[:1000]}")
 
-            # Chunk text & save embeddings
-            chunks = chunk_text(pdf_text)
-            logger.info(f"Created {len(chunks)} text chunks")
-            
-            for chunk in chunks:
-                embedding = self.embedding_func(chunk)
-                self.db.execute(
-                    sql_text("""
-                        INSERT INTO document_embeddings (document_id, content, embedding, created_at)
-                        VALUES (:doc_id, :content, :embedding, :created_at)
-                    """),
-                    {
-                        "doc_id": document_id, 
-                        "content": chunk,
-                        "embedding": embedding, 
-                        "created_at": datetime.now()
-                    }
-                )
+            # Parse the transaction sections in a worker thread while chunks are embedded and saved
+            transactions_future = loop.run_in_executor(None, parse_transactions, pdf_text)
+            await loop.run_in_executor(None, self._save_document, pdf_text, document_id, fund_id)
 
-            # Parse and save fund info
-            fund_info = parse_fund_info(pdf_text)
-            logger.info(f"Parsed fund info: {fund_info}")
-            
-            # Check if fund already exists
-            fund_check = self.db.execute(
-                sql_text("SELECT id FROM funds WHERE id=:fund_id"),
-                {"fund_id": fund_id}
-            ).fetchone()
+            transactions = await transactions_future
+            transactions_future = None
+            await loop.run_in_executor(None, self._save_transactions, fund_id, transactions)
             
-            if fund_check:
-                # Update existing fund record
-                self.db.execute(
-                    sql_text("""
-                        UPDATE funds
-                        SET name=:name, gp_name=:gp_name, vintage_year=:vintage_year
-                        WHERE id=:fund_id
-                    """),
-                    {
-                        "name": fund_info['name'],
-                        "gp_name": fund_info['gp_name'],
-                        "vintage_year": fund_info['vintage_year'],
-                        "fund_id": fund_id
-                    }
-                )
-            else:
-                # Insert new fund record
-                result = self.db.execute(
-                    sql_text("""
-                        INSERT INTO funds (name, gp_name, vintage_year, fund_type, created_at)
-                        VALUES (:name, :gp_name, :vintage_year, 'Private Equity', :created_at)
-                        RETURNING id
-                    """),
-                    {
-                        "name": fund_info['name'],
-                        "gp_name": fund_info['gp_name'],
-                        "vintage_year": fund_info['vintage_year'],
-                        "created_at": datetime.now()
-                    }
-                )
-                fund_id = result.fetchone()[0]
-                logger.info(f"Created new fund with ID: {fund_id}")
-                
-                # Update document with fund_id
-                self.db.execute(
-                    sql_text("UPDATE documents SET fund_id=:fund_id WHERE id=:doc_id"),
-                    {"fund_id": fund_id, "doc_id": document_id}
-                )
+            # Build summary result
+            summary = {
+                "status": "success",
+                "document_id": document_id,
+                "fund_id": fund_id,
+                "parsed": {
+                    "capital_calls": len(transactions['capital_calls']),
+                    "distributions": len(transactions['distributions']),
+                    "adjustments": len(transactions['adjustments'])
+                }
+            }
+            logger.info(f"Processing complete: {summary}")
+            return summary
+
+        except Exception as e:
+            if transactions_future is not None:
+                # Saving failed while parsing ran alongside: wait for the parse, so its
+                # thread is done and a parse error is logged instead of lost unretrieved
+                try:
+                    await transactions_future
+                except Exception as parse_error:
+                    logger.error(f"Transaction parsing failed: {parse_error}", exc_info=True)
+            # Rollback on any failure
+            await loop.run_in_executor(None, self.db.rollback)
+            logger.error(f"Document processing failed: {e}", exc_info=True)
+            return {"status": "failed", "document_id": document_id, "error": str(e)}
 
-            # Parse and insert capital calls
-            capital_calls = parse_capital_calls(pdf_text)
-            logger.info(f"Parsed {len(capital_calls)} capital calls")
+    def _save_document(self, pdf_text: str, document_id: int, fund_id: int):
+        """Save the chunk embeddings and fund info, and link the document to the fund"""
+        # All ingest writes share one transaction, committed by _save_transactions. Rows take
+        # created_at from now() (UTC, like the models' utcnow default), which is the
+        # transaction start time: one timestamp per document, with no per-row parameter
+        self.db.execute(_INGEST_TRANSACTION_SETTINGS)
+        
+        # Chunk text & save embeddings batch by batch, so only one batch of chunks,
+        # embeddings and rows is held in memory at a time
+        chunks = iter_chunks(pdf_text)
+        chunk_count = 0
+        while batch := list(itertools.islice(chunks, EMBEDDING_BATCH_SIZE)):
+            self._save_chunk_embeddings(document_id, batch)
+            chunk_count += len(batch)
+        logger.info(f"Created {chunk_count} text chunks")
+
+        # Parse and save fund info
+        fund_info = parse_fund_info(pdf_text)
+        logger.info(f"Parsed fund info: {fund_info}")
+        
+        # Create or update the fund and link the document to it in one statement;
+        # xmax = 0 only for a freshly inserted fund row
+        fund_created = self.db.execute(
+            sql_text("""
+                WITH fund AS (
+                    INSERT INTO funds (id, name, gp_name, vintage_year, fund_type, created_at)
+                    VALUES (:fund_id, :name, :gp_name, :vintage_year, 'Private Equity', now() AT TIME ZONE 'utc')
+                    ON CONFLICT (id) DO UPDATE
+                    SET name=EXCLUDED.name, gp_name=EXCLUDED.gp_name, vintage_year=EXCLUDED.vintage_year
+                    RETURNING id, (xmax = 0) AS inserted
+                ), document AS (
+                    UPDATE documents SET fund_id=(SELECT id FROM fund) WHERE id=:doc_id
+                )
+                SELECT inserted FROM fund
+            """),
+            {
+                "fund_id": fund_id,
+                "doc_id": document_id,
+                "name": fund_info['name'],
+                "gp_name": fund_info['gp_name'],
+                "vintage_year": fund_info['vintage_year']
+            }
+        ).scalar()
+        
+        if fund_created:
+            logger.info(f"Created new fund with ID: {fund_id}")
             
-            for call in capital_calls:
-                self.db.execute(
-                    sql_text("""
-                        INSERT INTO capital_calls (fund_id, call_date, call_type, amount, description, created_at)
-                        VALUES (:fund_id, :call_date, :call_type, :amount, :description, :created_at)
-                    """),
+            # The id was given explicitly, so move the serial sequence past it
+            self.db.execute(sql_text(
+                "SELECT setval(pg_get_serial_sequence('funds', 'id'), (SELECT MAX(id) FROM funds))"
+            ))
+
+    def _save_transactions(self, fund_id: int, transactions: Dict[str, List[Dict]]):
+        """Insert the parsed transaction rows and commit the ingest transaction"""
+        # Parse and insert capital calls
+        capital_calls = transactions['capital_calls']
+        logger.info(f"Parsed {len(capital_calls)} capital calls")
+        
+        if capital_calls:
+            self.db.execute(
+                sql_text("""
+                    INSERT INTO capital_calls (fund_id, call_date, call_type, amount, description, created_at)
+                    VALUES (:fund_id, :call_date, :call_type, :amount, :description, now() AT TIME ZONE 'utc')
+                """),
+                [
                     {
                         "fund_id": fund_id,
                         "call_date": call['call_date'],
                         "call_type": call['call_type'],
                         "amount": call['amount'],
-                        "description": call['description'],
-                        "created_at": datetime.now()
+                        "description": call['description']
                     }
-                )
+                    for call in capital_calls
+                ]
+            )
 
-            # Parse and insert distributions
-            distributions = parse_distributions(pdf_text)
-            logger.info(f"Parsed {len(distributions)} distributions")
-            
-            for dist in distributions:
-                self.db.execute(
-                    sql_text("""
-                        INSERT INTO distributions (fund_id, distribution_date, distribution_type, amount, is_recallable, description, created_at)
-                        VALUES (:fund_id, :distribution_date, :distribution_type, :amount, :is_recallable, :description, :created_at)
-                    """),
+        # Parse and insert distributions
+        distributions = transactions['distributions']
+        logger.info(f"Parsed {len(distributions)} distributions")
+        
+        if distributions:
+            self.db.execute(
+                sql_text("""
+                    INSERT INTO distributions (fund_id, distribution_date, distribution_type, amount, is_recallable, description, created_at)
+                    VALUES (:fund_id, :distribution_date, :distribution_type, :amount, :is_recallable, :description, now() AT TIME ZONE 'utc')
+                """),
+                [
                     {
                         "fund_id": fund_id,
                         "distribution_date": dist['distribution_date'],
                         "distribution_type": dist['distribution_type'],
                         "amount": dist['amount'],
                         "is_recallable": dist['is_recallable'],
-                        "description": dist['description'],
-                        "created_at": datetime.now()
+                        "description": dist['description']
                     }
-                )
+                    for dist in distributions
+                ]
+            )
 
-            # Parse and insert adjustments
-            adjustments = parse_adjustments(pdf_text)
-            logger.info(f"Parsed {len(adjustments)} adjustments")
-            
-            for adj in adjustments:
-                self.db.execute(
-                    sql_text("""
-                        INSERT INTO adjustments (fund_id, adjustment_date, adjustment_type, amount, description, created_at)
-                        VALUES (:fund_id, :adjustment_date, :adjustment_type, :amount, :description, :created_at)
-                    """),
+        # Parse and insert adjustments
+        adjustments = transactions['adjustments']
+        logger.info(f"Parsed {len(adjustments)} adjustments")
+        
+        if adjustments:
+            self.db.execute(
+                sql_text("""
+                    INSERT INTO adjustments (fund_id, adjustment_date, adjustment_type, amount, description, created_at)
+                    VALUES (:fund_id, :adjustment_date, :adjustment_type, :amount, :description, now() AT TIME ZONE 'utc')
+                """),
+                [
                     {
                         "fund_id": fund_id,
                         "adjustment_date": adj['adjustment_date'],
                         "adjustment_type": adj['adjustment_type'],
                         "amount": adj['amount'],
-                        "description": adj['description'],
-                        "created_at": datetime.now()
+                        "description": adj['description']
                     }
-                )
+                    for adj in adjustments
+                ]
+            )
 
-            # Commit all inserts
-            self.db.commit()
-            
-            # Build summary result
-            summary = {
-                "status": "success",
-                "document_id": document_id,
-                "fund_id": fund_id,
-                "parsed": {
-                    "capital_calls": len(capital_calls),
-                    "distributions": len(distributions),
-                    "adjustments": len(adjustments)
-                }
-            }
-            logger.info(f"Processing complete: {summary}")
-            return summary
-
-        except Exception as e:
-            # Rollback on any failure
-            self.db.rollback()
-            logger.error(f"Document processing failed: {e}", exc_info=True)
-            return {"status": "failed", "document_id": document_id, "error": str(e)}
\ No newline at end of file
+        # Commit all inserts
+        self.db.commit()
@@ -2,29 +2,116 @@
 Fund metrics calculator service
 """
 from typing import Dict, Any, Optional
-from decimal import Decimal
 import numpy as np
 import numpy_financial as npf
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Float, bindparam, cast, func, literal, literal_column, null, select, union_all
 from app.models.transaction import CapitalCall, Distribution, Adjustment
 
 
+def _total(amount, *criteria):
+    # Summed exactly as numeric, then returned as float8 so the driver hands back
+    # floats (the metrics are floats) instead of Decimals
+    return select(
+        cast(func.coalesce(func.sum(amount), 0), Float)
+    ).where(*criteria).scalar_subquery()
+
+
+# The aggregate statement is built once at import and executed with a bound :fund_id, so
+# each request reuses the same statement object (and its compiled-cache entry) instead of
+# rebuilding the expression tree
+_FUND_ID = bindparam("fund_id")
+_AGGREGATES = select(
+    _total(CapitalCall.amount, CapitalCall.fund_id == _FUND_ID).label("total_calls"),
+    _total(Adjustment.amount, Adjustment.fund_id == _FUND_ID).label("total_adjustments"),
+    _total(
+        Adjustment.amount,
+        Adjustment.fund_id == _FUND_ID,
+        Adjustment.adjustment_type == "NAV_ADJUSTMENT"
+    ).label("nav"),
+    _total(Distribution.amount, Distribution.fund_id == _FUND_ID).label("total_distributions"),
+)
+
+
+def irr_newton(amounts, guess: float = 0.1, tol: float = 1e-9, max_iter: int = 100) -> Optional[float]:
+    """
+    Solve NPV(r) = sum(cf[t] / (1 + r)**t) = 0 for periodic cash flows with Newton-Raphson,
+    safeguarded by bisection. Each step is a couple of vectorized O(N) sums, where npf.irr
+    finds every root of the cash-flow polynomial (an O(N^3) eigenvalue problem).
+    Only flows with a single sign change are solved: their IRR is unique, so this returns
+    the same rate as npf.irr. Returns None otherwise, or if the iteration does not converge.
+    """
+    cash_flows = np.asarray(amounts, dtype=np.float64)
+    periods = np.flatnonzero(cash_flows)
+    cash_flows = cash_flows[periods]
+    signs = np.signbit(cash_flows)
+    changes = np.flatnonzero(signs[1:] != signs[:-1])
+    if changes.size != 1:
+        return None
+    if not signs[0]:
+        cash_flows = -cash_flows  # same roots, outflows first
+    
+    # Scale NPV by (1 + r)**p, p the period of the first inflow. Every term of
+    # h(r) = sum(cf[t] * (1 + r)**(p - t)) then decreases in r, so h has exactly one root
+    # on (-1, inf), with h > 0 left of it and h < 0 right of it
+    exponents = periods[changes[0] + 1] - periods.astype(np.float64)
+    weighted = exponents * cash_flows
+    
+    def value_and_slope(rate):
+        growth = (1.0 + rate) ** exponents
+        return np.dot(cash_flows, growth), np.dot(weighted, growth) / (1.0 + rate)
+    
+    low, high = -1.0, None  # bracket of the root (low is exclusive)
+    widths = [np.inf, np.inf]  # bracket widths of the last two steps
+    rate = guess
+    with np.errstate(all="ignore"):
+        for _ in range(max_iter):
+            value, slope = value_and_slope(rate)
+            if value == 0:
+                return float(rate)
+            if value > 0:
+                low = rate
+            else:
+                high = rate
+            
+            next_rate = rate - value / slope
+            if high is None:
+                # Root is still unbounded above: grow the rate unless Newton moves right
+                if not next_rate > rate:
+                    next_rate = 2 * rate + 1
+            else:
+                # Bisect when Newton leaves the bracket, or crawls (far from the root h
+                # is nearly exponential) without halving the bracket every two steps
+                width = high - low
+                if not low < next_rate < high or width > widths[0] / 2:
+                    next_rate = (low + high) / 2
+                widths = [widths[1], width]
+            
+            if abs(next_rate - rate) < tol:
+                return float(next_rate)
+            rate = next_rate
+    return None
+
+
 class MetricsCalculator:
     """Calculate fund performance metrics such as PIC, DPI, IRR, NAV, RVPI, and TVPI."""
     
     def __init__(self, db: Session):
         self.db = db
+        # PIC / distribution / NAV totals keyed by (metric, fund_id), so the ratio methods
+        # and breakdowns share one query per total. A calculator lives for one request
+        self._cache: Dict[tuple, Any] = {}
     
     def calculate_all_metrics(self, fund_id: int) -> Dict[str, Any]:
         """Compute all key performance metrics for a given fund."""
-        pic = self.calculate_pic(fund_id)
-        total_distributions = self.calculate_total_distributions(fund_id)
-        dpi = self.calculate_dpi(fund_id)
+        # One round-trip for every sum the ratios need, instead of a query per metric
+        pic, total_distributions, nav = self._load_totals(fund_id)
         irr = self.calculate_irr(fund_id)
-        nav = self.calculate_nav(fund_id)
-        rvpi = self.calculate_rvpi(fund_id)
-        tvpi = self.calculate_tvpi(fund_id)        
+        
+        # Same rounding and zero-PIC handling as calculate_dpi / calculate_rvpi / calculate_tvpi
+        dpi = round(float(total_distributions) / float(pic), 4) if pic else 0.0
+        rvpi = round(nav / float(pic), 4) if pic else 0.0
+        tvpi = round((float(total_distributions) + nav) / float(pic), 4) if pic else 0.0
         
         return {
             "pic": float(pic) if pic else 0,
@@ -36,43 +123,48 @@ class MetricsCalculator:
             "tvpi": float(tvpi) if tvpi else 0,
         }
     
-    def calculate_pic(self, fund_id: int) -> Optional[Decimal]:
+    def _load_totals(self, fund_id: int) -> tuple:
+        """
+        Fetch PIC, total distributions and NAV with one aggregate query and memoize them
+        for calculate_pic / calculate_total_distributions / calculate_nav
+        """
+        totals = self._fetch_aggregates(fund_id)
+        pic = max(totals["total_calls"] - totals["total_adjustments"], 0.0)
+        total_distributions = totals["total_distributions"]
+        nav = totals["nav"]
+        self._cache.update({
+            ("pic", fund_id): pic,
+            ("total_distributions", fund_id): total_distributions,
+            ("nav", fund_id): nav,
+        })
+        return pic, total_distributions, nav
+    
+    def _fetch_aggregates(self, fund_id: int) -> Dict[str, float]:
+        """
+        Fetch the capital call, adjustment, NAV adjustment and distribution totals
+        of a fund in a single query. Missing rows sum to 0.
+        """
+        row = self.db.execute(_AGGREGATES, {"fund_id": fund_id}).one()
+        return dict(row._mapping)
+    
+    def calculate_pic(self, fund_id: int) -> Optional[float]:
         """
         Calculate Paid-In Capital (PIC)
         PIC = Total Capital Calls - Adjustments
         """
-        # Get total capital calls
-        total_calls = self.db.query(
-            func.sum(CapitalCall.amount)
-        ).filter(
-            CapitalCall.fund_id == fund_id
-        ).scalar() or Decimal(0)
-        
-        # Get total adjustments
-        total_adjustments = self.db.query(
-            func.sum(Adjustment.amount)
-        ).filter(
-            Adjustment.fund_id == fund_id
-        ).scalar() or Decimal(0)
-        
-        # Compute PIC as total calls minus adjustments
-        pic = total_calls - total_adjustments
-        return pic if pic > 0 else Decimal(0)
+        # PIC, distributions and NAV come from one aggregate query, shared through the cache
+        if ("pic", fund_id) not in self._cache:
+            self._load_totals(fund_id)
+        return self._cache[("pic", fund_id)]
     
-    def calculate_total_distributions(self, fund_id: int) -> Optional[Decimal]:
+    def calculate_total_distributions(self, fund_id: int) -> Optional[float]:
         """
         Calculate the total amount of distributions for a given fund.
         Returns the sum of all distribution amounts or 0 if none exist.
         """
-        # Sum all distribution amounts for the specified fund
-        total = self.db.query(
-            func.sum(Distribution.amount)
-        ).filter(
-            Distribution.fund_id == fund_id
-        ).scalar() or Decimal(0)
-        
-        # Return total distributions as Decimal
-        return total
+        if ("total_distributions", fund_id) not in self._cache:
+            self._load_totals(fund_id)
+        return self._cache[("total_distributions", fund_id)]
     
     def calculate_dpi(self, fund_id: int) -> Optional[float]:
         """
@@ -95,24 +187,31 @@ class MetricsCalculator:
     def calculate_irr(self, fund_id: int) -> Optional[float]:
         """
         Calculate IRR (Internal Rate of Return)
-        Uses numpy-financial's irr function
+        Uses Newton-Raphson, falling back to numpy-financial's irr function
         """
         try:
-            # Get all cash flows sorted by date
-            cash_flows = self._get_cash_flows(fund_id)
+            # Get all cash flow amounts sorted by date
+            amounts = self._get_cash_flow_amounts(fund_id)
             
-            if len(cash_flows) < 2:
+            if len(amounts) < 2:
                 return None
             
-            # Extract amounts
-            amounts = [cf['amount'] for cf in cash_flows]
+            # Without both an outflow and an inflow NPV has no root; skip the solvers
+            if amounts.min() >= 0 or amounts.max() <= 0:
+                return None
             
-            # Calculate IRR (returns as decimal, e.g., 0.15 for 15%)
-            irr = npf.irr(amounts)
+            # Calculate the monthly IRR (returns as decimal, e.g., 0.01 for 1%); the
+            # eigenvalue based npf.irr only runs for flows irr_newton does not solve
+            irr = irr_newton(amounts)
+            if irr is None:
+                irr = npf.irr(amounts)
             
             if irr is None or np.isnan(irr) or np.isinf(irr):
                 return None
             
+            # Compound the monthly rate into an annual one
+            irr = (1.0 + irr) ** 12 - 1.0
+            
             # Convert to percentage
             return round(float(irr) * 100, 2)
             
@@ -127,14 +226,9 @@ class MetricsCalculator:
         For simplicity, we use any Adjustment entries tagged as 'NAV_ADJUSTMENT'.
         """
         try:
-            # Sum all adjustment amounts labeled as 'NAV_ADJUSTMENT' for the given fund
-            nav_value = self.db.query(func.sum(Adjustment.amount)).filter(
-                Adjustment.fund_id == fund_id,
-                Adjustment.adjustment_type == "NAV_ADJUSTMENT"
-            ).scalar() or Decimal(0)
-            
-            # Return NAV as a float value
-            return float(nav_value)
+            if ("nav", fund_id) not in self._cache:
+                self._load_totals(fund_id)
+            return self._cache[("nav", fund_id)]
         except Exception as e:
             # Log or print any unexpected database or conversion errors
             print(f"Error calculating NAV: {e}")
@@ -193,51 +287,104 @@ class MetricsCalculator:
             return None
 
     
+    def _cash_flows(self, fund_id: int):
+        """
+        Subquery of every cash flow of a fund (date, amount, type)
+        Capital calls are negative, distributions are positive
+        """
+        calls = select(
+            CapitalCall.call_date.label("date"),
+            (-CapitalCall.amount).label("amount"),  # Negative for outflow
+            literal("capital_call").label("type")
+        ).where(CapitalCall.fund_id == fund_id)
+        distributions = select(
+            Distribution.distribution_date.label("date"),
+            Distribution.amount.label("amount"),  # Positive for inflow
+            literal("distribution").label("type")
+        ).where(Distribution.fund_id == fund_id)
+        return union_all(calls, distributions).subquery()
+    
     def _get_cash_flows(self, fund_id: int) -> list:
         """
         Get all cash flows for IRR calculation
         Capital calls are negative, distributions are positive
         """
-        cash_flows = []
-        
-        # Get capital calls (negative cash flows)
-        calls = self.db.query(
-            CapitalCall.call_date,
-            CapitalCall.amount
-        ).filter(
-            CapitalCall.fund_id == fund_id
-        ).order_by(
-            CapitalCall.call_date
+        # Both kinds of flow come back in one round-trip, already in date order
+        # (a capital call sorts before a distribution on the same date)
+        flows = self._cash_flows(fund_id)
+        rows = self.db.execute(
+            select(flows.c.date, cast(flows.c.amount, Float).label("amount"), flows.c.type)
+            .order_by(flows.c.date, flows.c.type)
         ).all()
-        
-        for call in calls:
-            cash_flows.append({
-                'date': call.call_date,
-                'amount': -float(call.amount),  # Negative for outflow
-                'type': 'capital_call'
-            })
-        
-        # Get distributions (positive cash flows)
-        distributions = self.db.query(
-            Distribution.distribution_date,
-            Distribution.amount
-        ).filter(
-            Distribution.fund_id == fund_id
-        ).order_by(
-            Distribution.distribution_date
+        return [
+            {'date': row.date, 'amount': row.amount, 'type': row.type}
+            for row in rows
+        ]
+    
+    def _get_cash_flow_amounts(self, fund_id: int) -> np.ndarray:
+        """
+        Get the net cash flow of every month from the first flow to the last as a float64
+        array, months without flows being 0. IRR assumes equally spaced periods, which
+        per-transaction flows are not; this also keeps the solver input O(months)
+        """
+        flows = self._cash_flows(fund_id)
+        # Inline 'month' so the SELECT and GROUP BY expressions are identical
+        bucket = func.date_trunc(literal_column("'month'"), flows.c.date).label("bucket")
+        rows = self.db.execute(
+            select(bucket, cast(func.sum(flows.c.amount), Float))
+            .group_by(bucket)
+            .order_by(bucket)
         ).all()
+        if not rows:
+            return np.zeros(0, dtype=np.float64)
         
-        for dist in distributions:
-            cash_flows.append({
-                'date': dist.distribution_date,
-                'amount': float(dist.amount),  # Positive for inflow
-                'type': 'distribution'
-            })
+        months = np.fromiter(
+            (month.year * 12 + month.month for month, _ in rows), dtype=np.int64, count=len(rows)
+        )
+        amounts = np.zeros(months[-1] - months[0] + 1, dtype=np.float64)
+        amounts[months - months[0]] = [amount for _, amount in rows]
+        return amounts
+    
+    def _fetch_transactions(self, fund_id: int, kinds: tuple) -> Dict[str, list]:
+        """
+        Fetch the transactions of the given kinds ('capital_calls', 'distributions',
+        'adjustments') in one UNION ALL query, each list in date order.
+        Rows have kind, date, amount, description, is_recallable and adjustment_type.
+        """
+        def transaction_select(kind, date, amount, description, is_recallable, adjustment_type):
+            # Every branch is labelled, since any of them may come first in the UNION.
+            # Amounts come back as float8, as the breakdowns report floats
+            return select(
+                literal(kind).label("kind"),
+                date.label("date"),
+                cast(amount, Float).label("amount"),
+                description.label("description"),
+                is_recallable.label("is_recallable"),
+                adjustment_type.label("adjustment_type")
+            )
         
-        # Sort by date
-        cash_flows.sort(key=lambda x: x['date'])
+        selects = {
+            "capital_calls": transaction_select(
+                "capital_calls", CapitalCall.call_date, CapitalCall.amount,
+                CapitalCall.description, null(), null()
+            ).where(CapitalCall.fund_id == fund_id),
+            "distributions": transaction_select(
+                "distributions", Distribution.distribution_date, Distribution.amount,
+                Distribution.description, Distribution.is_recallable, null()
+            ).where(Distribution.fund_id == fund_id),
+            "adjustments": transaction_select(
+                "adjustments", Adjustment.adjustment_date, Adjustment.amount,
+                Adjustment.description, null(), Adjustment.adjustment_type
+            ).where(Adjustment.fund_id == fund_id),
+        }
+        rows = self.db.execute(
+            union_all(*(selects[kind] for kind in kinds)).order_by("date")
+        ).all()
         
-        return cash_flows
+        transactions = {kind: [] for kind in kinds}
+        for row in rows:
+            transactions[row.kind].append(row)
+        return transactions
     
     def get_calculation_breakdown(self, fund_id: int, metric: str) -> Dict[str, Any]:
         """
@@ -252,22 +399,18 @@ class MetricsCalculator:
         """
         # DPI (Distribution to Paid-In) Breakdown
         if metric == "dpi":
+            # calculate_pic runs the one aggregate query the others read from the cache
             pic = self.calculate_pic(fund_id)
             total_distributions = self.calculate_total_distributions(fund_id)
             dpi = self.calculate_dpi(fund_id)
             
             # Fetch related transactions for transparency
-            capital_calls = self.db.query(CapitalCall).filter(
-                CapitalCall.fund_id == fund_id
-            ).order_by(CapitalCall.call_date).all()
-            
-            distributions = self.db.query(Distribution).filter(
-                Distribution.fund_id == fund_id
-            ).order_by(Distribution.distribution_date).all()
-            
-            adjustments = self.db.query(Adjustment).filter(
-                Adjustment.fund_id == fund_id
-            ).order_by(Adjustment.adjustment_date).all()
+            transactions = self._fetch_transactions(
+                fund_id, ("capital_calls", "distributions", "adjustments")
+            )
+            capital_calls = transactions["capital_calls"]
+            distributions = transactions["distributions"]
+            adjustments = transactions["adjustments"]
             
             # Return full breakdown with values and transactions
             return {
@@ -280,14 +423,14 @@ class MetricsCalculator:
                 "transactions": {
                     "capital_calls": [
                         {
-                            "date": str(call.call_date),
+                            "date": str(call.date),
                             "amount": float(call.amount),
                             "description": call.description
                         } for call in capital_calls
                     ],
                     "distributions": [
                         {
-                            "date": str(dist.distribution_date),
+                            "date": str(dist.date),
                             "amount": float(dist.amount),
                             "is_recallable": dist.is_recallable,
                             "description": dist.description
@@ -295,7 +438,7 @@ class MetricsCalculator:
                     ],
                     "adjustments": [
                         {
-                            "date": str(adj.adjustment_date),
+                            "date": str(adj.date),
                             "amount": float(adj.amount),
                             "type": adj.adjustment_type,
                             "description": adj.description
@@ -327,15 +470,10 @@ class MetricsCalculator:
         
         # Handle PIC (Paid-In Capital)
         elif metric == "pic":
-            # Get detailed capital calls
-            capital_calls = self.db.query(CapitalCall).filter(
-                CapitalCall.fund_id == fund_id
-            ).order_by(CapitalCall.call_date).all()
-            
-            # Get detailed adjustments
-            adjustments = self.db.query(Adjustment).filter(
-                Adjustment.fund_id == fund_id
-            ).order_by(Adjustment.adjustment_date).all()
+            # Get detailed capital calls and adjustments
+            transactions = self._fetch_transactions(fund_id, ("capital_calls", "adjustments"))
+            capital_calls = transactions["capital_calls"]
+            adjustments = transactions["adjustments"]
             
             total_calls = sum(float(call.amount) for call in capital_calls)
             total_adjustments = sum(float(adj.amount) for adj in adjustments)
@@ -352,14 +490,14 @@ class MetricsCalculator:
                 "transactions": {
                     "capital_calls": [
                         {
-                            "date": str(call.call_date),
+                            "date": str(call.date),
                             "amount": float(call.amount),
                             "description": call.description
                         } for call in capital_calls
                     ],
                     "adjustments": [
                         {
-                            "date": str(adj.adjustment_date),
+                            "date": str(adj.date),
                             "amount": float(adj.amount),
                             "type": adj.adjustment_type,
                             "description": adj.description
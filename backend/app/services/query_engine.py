@@ -2,6 +2,7 @@
 Query engine service for RAG-based question answering
 """
 from typing import Dict, Any, List, Optional
+import re
 import time
 from langchain_openai import ChatOpenAI
 from langchain_community.llms import Ollama
@@ -12,6 +13,30 @@ from app.services.metrics_calculator import MetricsCalculator
 from sqlalchemy.orm import Session
 
 
+def _keyword_re(keywords: List[str]) -> re.Pattern:
+    """One compiled alternation matching any of the keywords as a substring"""
+    return re.compile("|".join(map(re.escape, keywords)))
+
+# Intent keywords, checked in this order (a query matching several categories gets the
+# first). Each category is one precompiled pattern, scanned once per query
+_INTENT_PATTERNS = (
+    # Calculation keywords
+    ("calculation", _keyword_re([
+        "calculate", "what is the", "current", "dpi", "irr", "tvpi",
+        "rvpi", "pic", "paid-in capital", "return", "performance"
+    ])),
+    # Definition keywords
+    ("definition", _keyword_re([
+        "what does", "mean", "define", "explain", "definition",
+        "what is a", "what are"
+    ])),
+    # Retrieval keywords
+    ("retrieval", _keyword_re([
+        "show me", "list", "all", "find", "search", "when",
+        "how many", "which"
+    ])),
+)
+
 class QueryEngine:
     """Handles fund analysis queries using RAG (Retrieval-Augmented Generation)."""
     
@@ -100,29 +125,9 @@ class QueryEngine:
         """
         query_lower = query.lower()
         
-        # Calculation keywords
-        calc_keywords = [
-            "calculate", "what is the", "current", "dpi", "irr", "tvpi", 
-            "rvpi", "pic", "paid-in capital", "return", "performance"
-        ]
-        if any(keyword in query_lower for keyword in calc_keywords):
-            return "calculation"
-        
-        # Definition keywords
-        def_keywords = [
-            "what does", "mean", "define", "explain", "definition", 
-            "what is a", "what are"
-        ]
-        if any(keyword in query_lower for keyword in def_keywords):
-            return "definition"
-        
-        # Retrieval keywords
-        ret_keywords = [
-            "show me", "list", "all", "find", "search", "when", 
-            "how many", "which"
-        ]
-        if any(keyword in query_lower for keyword in ret_keywords):
-            return "retrieval"
+        for intent, pattern in _INTENT_PATTERNS:
+            if pattern.search(query_lower):
+                return intent
         
         return "general"
     
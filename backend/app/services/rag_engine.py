@@ -10,7 +10,6 @@ Handles:
 
 from typing import List, Dict, Any, Optional
 import math
-import asyncio
 from app.services.vector_store import VectorStore
 from app.core.config import settings
 
@@ -29,14 +28,15 @@ class RAGEngine:
         """
         Split text into overlapping chunks for embedding
         """
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + CHUNK_SIZE
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start += CHUNK_SIZE - CHUNK_OVERLAP
-        return chunks
+        if not text:
+            return []
+        # One slice per window start, stepping by the chunk size minus the overlap. A window
+        # starting within the last CHUNK_OVERLAP characters would only repeat the tail of
+        # the previous chunk (and cost an extra embedding), so the starts stop before it
+        return [
+            text[start:start + CHUNK_SIZE]
+            for start in range(0, max(len(text) - CHUNK_OVERLAP, 1), CHUNK_SIZE - CHUNK_OVERLAP)
+        ]
 
     async def add_document(self, document_id: int, fund_id: int, content: str, metadata: Optional[Dict[str, Any]] = None):
         """
@@ -49,11 +49,8 @@ class RAGEngine:
         # Split document into smaller chunks
         chunks = self.chunk_text(content)
         
-        # Create async embedding tasks for each chunk
-        tasks = []
-        for chunk in chunks:
-            tasks.append(self.vector_store.add_document(chunk, metadata))
-        await asyncio.gather(*tasks)
+        # Embed and store all chunks in batches instead of one model call per chunk
+        await self.vector_store.add_documents(chunks, [metadata] * len(chunks))
 
     async def retrieve_context(self, query: str, fund_id: Optional[int] = None, top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -109,13 +106,14 @@ class RAGEngine:
         Each document should be a dict: {"document_id": int, "fund_id": int, "content": str, "metadata": dict}
         """
         
-        # Create async tasks for each document
-        tasks = []
+        # Chunk every document first, so all chunks share the same embedding batches
+        contents = []
+        metadatas = []
         for doc in documents:
-            tasks.append(self.add_document(
-                document_id=doc["document_id"],
-                fund_id=doc["fund_id"],
-                content=doc["content"],
-                metadata=doc.get("metadata")
-            ))
-        await asyncio.gather(*tasks) # Run all upload tasks concurrently
+            metadata = dict(doc.get("metadata") or {})
+            metadata["document_id"] = doc["document_id"]
+            metadata["fund_id"] = doc["fund_id"]
+            chunks = self.chunk_text(doc["content"])
+            contents.extend(chunks)
+            metadatas.extend([metadata] * len(chunks))
+        await self.vector_store.add_documents(contents, metadatas)
@@ -1,6 +1,11 @@
+import re
 from typing import List
 from datetime import datetime
 
+# float() needs a digit (any Unicode decimal, like \d) unless the text spells inf/nan
+_DIGIT_RE = re.compile(r"\d")
+_NON_FINITE_RE = re.compile(r"\s*[+-]?(?:inf|infinity|nan)\s*\Z", re.IGNORECASE)
+
 class TableParser:
     """Parse, clean, classify tables from PDF pages"""
 
@@ -35,19 +40,23 @@ class TableParser:
         for row in table:
             for i, cell in enumerate(row):
                 if isinstance(cell, str):
-                    # Convert numbers
-                    try:
-                        # convert numeric strings to float
-                        row[i] = float(cell.replace(",", ""))
+                    # Only try conversions that can succeed, so plain text cells
+                    # don't raise (and catch) an exception per attempt
+                    if "/" in cell:
+                        # A number never contains '/', a DD/MM/YYYY date always does
+                        try:
+                            # parse date strings
+                            row[i] = datetime.strptime(cell, "%d/%m/%Y").date()
+                        except ValueError:
+                            pass
                         continue
-                    except:
-                        pass
-                    # Convert dates
-                    try:
-                        # parse date strings
-                        row[i] = datetime.strptime(cell, "%d/%m/%Y").date()
-                    except:
-                        pass
+                    number = cell.replace(",", "")
+                    if _DIGIT_RE.search(number) or _NON_FINITE_RE.match(number):
+                        try:
+                            # convert numeric strings to float
+                            row[i] = float(number)
+                        except ValueError:
+                            pass
         return table
 
     def classify_table(self, table: List[List[str]]) -> str:
@@ -1,8 +1,14 @@
 """
 Vector store service using pgvector (PostgreSQL extension)
 """
+import asyncio
+import csv
+import functools
+import io
 import json
+import threading
 import numpy as np
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -10,67 +16,191 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 from app.core.config import settings
 from app.db.session import SessionLocal
 
+# Chunks embedded per embed_documents call (bounds model batch memory)
+EMBEDDING_BATCH_SIZE = 32
+
+# HNSW candidate list size for searches (pgvector default 40); raised to k when k is larger
+HNSW_EF_SEARCH = 40
+
+# Query embeddings, keyed by (model name, text), shared by every VectorStore instance
+# (one is created per request). Least recently used entries are evicted past the limit
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+_query_embedding_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+# MiniLM embedding model, loaded once per process and shared by every VectorStore
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_embeddings: Optional[HuggingFaceEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+def _get_embeddings() -> HuggingFaceEmbeddings:
+    """Return the shared embedding model, loading it on first use"""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        return _embeddings
+
+def _halfvec_literal(embedding) -> str:
+    """
+    Format an embedding as a pgvector literal ('[x,y,...]') of its float16 values.
+    The column is halfvec, so the server would round to float16 anyway; the shortest
+    float16 repr keeps the text about half the size of a float32 one.
+    """
+    return "[" + ",".join(map(str, np.asarray(embedding, dtype=np.float16))) + "]"
+
+# Statements are built once per process (text() parses the SQL for its bind parameters)
+# rather than on every insert/search. CAST, since text() does not read
+# ':embedding::halfvec' as the parameter 'embedding'
+_INSERT_EMBEDDING_SQL = text("""
+    INSERT INTO document_embeddings (document_id, fund_id, content, embedding, metadata)
+    VALUES (:document_id, :fund_id, :content, CAST(:embedding AS halfvec), CAST(:metadata AS jsonb))
+""")
+_SET_EF_SEARCH_SQL = text("SELECT set_config('hnsw.ef_search', :ef_search, true)")
+
+# Columns similarity_search can filter on
+_FILTER_COLUMNS = ("document_id", "fund_id")
+
+@functools.lru_cache(maxsize=None)
+def _search_sql(filter_keys: tuple):
+    """Cosine similarity search statement filtered on the given columns, built once per filter set"""
+    embedding_pg = "CAST(:query_embedding AS halfvec)"
+    where_clause = ""
+    if filter_keys:
+        where_clause = "WHERE " + " AND ".join(f"{key} = :param_{key}" for key in filter_keys)
+    return text(f"""
+        SELECT 
+            id,
+            document_id,
+            fund_id,
+            content,
+            metadata,
+            1 - (embedding <=> {embedding_pg}) AS similarity_score
+        FROM document_embeddings
+        {where_clause}
+        ORDER BY embedding <=> {embedding_pg}
+        LIMIT :k
+    """)
+
+# Vector dimension for MiniLM-L6-v2 model
+EMBEDDING_DIMENSION = 384
+
+# Schema statements, run in order by VectorStore._ensure_extension. Columns come before
+# the indexes that use them, and old deployments are migrated to the current layout
+_SCHEMA_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS vector",
+    f"""
+    CREATE TABLE IF NOT EXISTS document_embeddings (
+        id SERIAL PRIMARY KEY,
+        document_id INTEGER,
+        fund_id INTEGER,
+        content TEXT NOT NULL,
+        content_hash BYTEA,  -- lets identical chunks reuse a stored embedding
+        embedding halfvec({EMBEDDING_DIMENSION}),  -- float16: half the storage and I/O of vector
+        metadata JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Tables created before content_hash existed
+    "ALTER TABLE document_embeddings ADD COLUMN IF NOT EXISTS content_hash BYTEA",
+    """
+    CREATE INDEX IF NOT EXISTS document_embeddings_content_hash_idx
+    ON document_embeddings (content_hash)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS document_embeddings_fund_id_idx
+    ON document_embeddings (fund_id)
+    """,
+    # The old IVFFlat index (vector_cosine_ops) is replaced by HNSW: better recall/latency
+    # and no retraining as rows grow. It has to go before the column type changes
+    "DROP INDEX IF EXISTS document_embeddings_embedding_idx",
+    # Tables created with a float32 vector column are converted to halfvec in place
+    f"""
+    DO $$
+    BEGIN
+        IF (
+            SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = 'document_embeddings'::regclass AND attname = 'embedding'
+        ) <> 'halfvec({EMBEDDING_DIMENSION})' THEN
+            ALTER TABLE document_embeddings
+            ALTER COLUMN embedding TYPE halfvec({EMBEDDING_DIMENSION})
+            USING embedding::halfvec({EMBEDDING_DIMENSION});
+        END IF;
+    END
+    $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS document_embeddings_embedding_hnsw_idx
+    ON document_embeddings USING hnsw (embedding halfvec_cosine_ops)
+    WITH (m = 16, ef_construction = 64)
+    """,
+)
+
 class VectorStore:
     """Vector store using pgvector and HuggingFace embeddings"""
     
+    # Set once the schema statements have run, so later instances skip the DDL
+    _extension_ready = False
+    
     def __init__(self, db: Session = None):
         # Use provided DB session or create a new one
         self.db = db or SessionLocal()
         # Use lightweight MiniLM embedding model (384 dimensions)
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embeddings = _get_embeddings()
         self._ensure_extension()
     
     def _ensure_extension(self):
-        """Enable pgvector extension and create table if needed"""
-        try:
-            # Enable pgvector extension
-            self.db.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-            dimension = 384  # Vector dimension for MiniLM-L6-v2 model
-
-            # Create table for document embeddings if it doesn't exist
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS document_embeddings (
-                id SERIAL PRIMARY KEY,
-                document_id INTEGER,
-                fund_id INTEGER,
-                content TEXT NOT NULL,
-                embedding vector({dimension}),
-                metadata JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            
-            CREATE INDEX IF NOT EXISTS document_embeddings_embedding_idx 
-            ON document_embeddings USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 100);
-            """
-            self.db.execute(text(create_table_sql))
-            self.db.commit()
-        except Exception as e:
-            print(f"Error ensuring pgvector extension: {e}")
-            self.db.rollback()
+        """Enable pgvector extension, and create or migrate the table and its indexes"""
+        if VectorStore._extension_ready:
+            return
+        # Each statement runs and commits on its own, so one failure (e.g. building an
+        # index) does not abort the statements after it
+        failed = []
+        for statement in _SCHEMA_DDL:
+            try:
+                self.db.execute(text(statement))
+                self.db.commit()
+            except Exception as e:
+                print(f"Error ensuring pgvector schema: {e}\nStatement: {statement.strip()}")
+                self.db.rollback()
+                failed.append(statement)
+        if failed:
+            print(
+                f"pgvector schema is incomplete ({len(failed)} statement(s) failed); "
+                "fix the errors above and restart the service"
+            )
+        # Attempted once per process: a schema error is reported here, not retried
+        # (and reported again) by every request
+        VectorStore._extension_ready = True
     
     async def _get_embedding(self, text: str) -> np.ndarray:
-        """Generate embedding using HuggingFace"""
+        """Generate a search query embedding using HuggingFace (repeated queries come from the LRU cache)"""
+        key = (getattr(self.embeddings, "model_name", None), text)
+        embedding = _query_embedding_cache.get(key)
+        if embedding is not None:
+            _query_embedding_cache.move_to_end(key)
+            return embedding
+        
         vec = self.embeddings.embed_query(text)
-        return np.array(vec, dtype=np.float32)
+        embedding = np.array(vec, dtype=np.float32)
+        embedding.flags.writeable = False  # shared between callers
+        _query_embedding_cache[key] = embedding
+        if len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+            _query_embedding_cache.popitem(last=False)
+        return embedding
     
     async def add_document(self, content: str, metadata: Dict[str, Any]):
         """Add a document to the vector store"""
         try:
-            # Generate embedding vector for the content
-            embedding = await self._get_embedding(content)
-            embedding_str = ','.join(map(str, embedding.tolist()))  # Format for pgvector
+            # Embed the content as a document; stored contents are one-off and would only
+            # evict search queries from the query embedding cache
+            embedding = self.embeddings.embed_documents([content])[0]
 
             # Insert record into database
-            insert_sql = text("""
-                INSERT INTO document_embeddings (document_id, fund_id, content, embedding, metadata)
-                VALUES (:document_id, :fund_id, :content, :embedding::vector, :metadata::jsonb)
-            """)
-            self.db.execute(insert_sql, {
+            self.db.execute(_INSERT_EMBEDDING_SQL, {
                 "document_id": metadata.get("document_id"),
                 "fund_id": metadata.get("fund_id"),
                 "content": content,
-                "embedding": embedding_str,
+                "embedding": _halfvec_literal(embedding),
                 "metadata": json.dumps(metadata)
             })
             self.db.commit()
@@ -79,6 +209,68 @@ class VectorStore:
             self.db.rollback()
             raise
     
+    async def add_documents(self, contents: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        Add many documents to the vector store: one embed_documents call per batch of
+        EMBEDDING_BATCH_SIZE contents and one COPY (or executemany INSERT) per batch,
+        committed once
+        """
+        # Embedding and the blocking DB writes run in a worker thread, off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._insert_documents, contents, metadatas)
+    
+    def _insert_documents(self, contents: List[str], metadatas: List[Dict[str, Any]]):
+        """Embed and write the documents of add_documents in one transaction"""
+        try:
+            for start in range(0, len(contents), EMBEDDING_BATCH_SIZE):
+                batch = contents[start:start + EMBEDDING_BATCH_SIZE]
+                embeddings = self.embeddings.embed_documents(batch)
+                rows = [
+                    {
+                        "document_id": metadata.get("document_id"),
+                        "fund_id": metadata.get("fund_id"),
+                        "content": content,
+                        "embedding": _halfvec_literal(embedding),
+                        "metadata": json.dumps(metadata)
+                    }
+                    for content, embedding, metadata in zip(batch, embeddings, metadatas[start:])
+                ]
+                if not self._copy_rows(rows):
+                    self.db.execute(_INSERT_EMBEDDING_SQL, rows)
+            # Single commit (one WAL flush) for every batch
+            self.db.commit()
+        except Exception as e:
+            print(f"Error adding documents: {e}")
+            self.db.rollback()
+            raise
+    
+    def _copy_rows(self, rows: List[Dict[str, Any]]) -> bool:
+        """
+        Stream rows into document_embeddings with COPY ... FROM STDIN (CSV), which skips
+        planning an INSERT per row. Returns False (nothing written) when the driver is
+        not psycopg2.
+        """
+        if self.db.get_bind().dialect.driver != "psycopg2":
+            return False
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)  # None is written unquoted and empty, i.e. NULL
+        for row in rows:
+            writer.writerow((
+                row["document_id"], row["fund_id"], row["content"], row["embedding"], row["metadata"]
+            ))
+        buffer.seek(0)
+        
+        # Raw DBAPI connection of the session's current transaction
+        raw_conn = self.db.connection().connection
+        with raw_conn.cursor() as cursor:
+            cursor.copy_expert(
+                "COPY document_embeddings (document_id, fund_id, content, embedding, metadata) "
+                "FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (content))",
+                buffer
+            )
+        return True
+    
     async def similarity_search(
         self, 
         query: str, 
@@ -89,38 +281,19 @@ class VectorStore:
         try:
             # Create query embedding
             query_embedding = await self._get_embedding(query)
-            embedding_pg = f"ARRAY[{','.join(map(str, query_embedding.tolist()))}]::vector"
 
             # Build optional metadata filter (fund_id, document_id)
-            where_clause = ""
-            params = {"k": k}
-
-            if filter_metadata:
-                conditions = []
-                for key, value in filter_metadata.items():
-                    if key in ["document_id", "fund_id"]:
-                        param_name = f"param_{key}"
-                        conditions.append(f"{key} = :{param_name}")
-                        params[param_name] = value
-                if conditions:
-                    where_clause = "WHERE " + " AND ".join(conditions)
+            params = {"k": k, "query_embedding": _halfvec_literal(query_embedding)}
+            filter_keys = []
+            for key, value in (filter_metadata or {}).items():
+                if key in _FILTER_COLUMNS:
+                    filter_keys.append(key)
+                    params[f"param_{key}"] = value
 
+            # An HNSW scan returns at most ef_search rows, so keep it at least k
+            self.db.execute(_SET_EF_SEARCH_SQL, {"ef_search": str(max(HNSW_EF_SEARCH, k))})
             # Query pgvector with cosine similarity
-            search_sql = text(f"""
-                SELECT 
-                    id,
-                    document_id,
-                    fund_id,
-                    content,
-                    metadata,
-                    1 - (embedding <=> {embedding_pg}) AS similarity_score
-                FROM document_embeddings
-                {where_clause}
-                ORDER BY embedding <=> {embedding_pg}
-                LIMIT :k
-            """)
-
-            result = self.db.execute(search_sql, params)
+            result = self.db.execute(_search_sql(tuple(filter_keys)), params)
             rows = result.fetchall()
 
             # Convert DB rows to Python dicts
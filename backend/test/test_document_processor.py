@@ -1,12 +1,18 @@
 import pytest
+import numpy as np
+from pathlib import Path
 from unittest.mock import MagicMock
 from datetime import datetime
+from app.core.config import settings
+from app.services import document_processor
 from app.services.document_processor import (
     parse_fund_info, parse_date, parse_amount,
     parse_capital_calls, parse_distributions, parse_adjustments,
-    DocumentProcessor
+    split_sections, parse_transactions, extract_pdf_text, DocumentProcessor
 )
 
+SAMPLE_PDF = Path(__file__).resolve().parents[2] / "files" / "Sample_Fund_Performance_Report.pdf"
+
 @pytest.fixture
 def mock_db():
     """Mock SQLAlchemy Session"""
@@ -90,10 +96,106 @@ def test_parse_adjustments():
     assert results[0]["amount"] == -1000.0
     assert results[1]["adjustment_type"] == "Fee"
 
+def test_row_parsers_handle_long_whitespace_runs():
+    # used to backtrack cubically on the run of padding
+    row = "2024-04-01" + " " * 5000 + "x"
+    assert document_processor.parse_distribution_rows(row) == []
+    assert document_processor.parse_adjustment_rows(row) == []
+
+def test_split_sections():
+    text = """
+    Capital Calls
+    Date Call Number Amount Description
+    2024-01-01 Call 1 $100,000 Initial investment
+    Adjustments
+    Date Type Amount Description
+    2024-06-01 Correction -$1,000 Typo fix
+    Performance Summary
+    """
+    sections = split_sections(text)
+    assert set(sections) == {"capital_calls", "adjustments"}
+    assert sections["capital_calls"] == "2024-01-01 Call 1 $100,000 Initial investment"
+    assert sections["adjustments"] == "2024-06-01 Correction -$1,000 Typo fix"
+
+def test_split_sections_any_order():
+    text = """
+    Adjustments
+    Date Type Amount Description
+    2024-06-01 Correction -$1,000 Typo fix
+    Capital Calls
+    Date Call Number Amount Description
+    2024-01-01 Call 1 $100,000 Initial investment
+    """
+    sections = split_sections(text)
+    assert sections["adjustments"] == "2024-06-01 Correction -$1,000 Typo fix"
+    assert sections["capital_calls"] == "2024-01-01 Call 1 $100,000 Initial investment"
+
+def test_split_sections_unicode_whitespace():
+    # PDF text often has a non-breaking space or vertical tab between words
+    for space in ("\xa0", "\x0b"):
+        text = f"Capital Calls{space}\nDate Call Number Amount Description\n2024-01-01 Call 1 $100,000 Initial"
+        assert split_sections(text)["capital_calls"] == "2024-01-01 Call 1 $100,000 Initial"
+
+def test_parse_transactions():
+    text = """
+    Capital Calls
+    Date Call Number Amount Description
+    2024-01-01 Call 1 $100,000 Initial investment
+    Performance Summary
+    """
+    transactions = parse_transactions(text)
+    assert [call["amount"] for call in transactions["capital_calls"]] == [100000.0]
+    assert transactions["distributions"] == []
+    assert transactions["adjustments"] == []
+
+def test_parse_transactions_reuses_cached_parse(monkeypatch):
+    text = "Capital Calls\nDate Call Number Amount Description\n2024-02-01 Call 7 $5,000 Cached"
+    first = parse_transactions(text)
+    first["capital_calls"][0]["amount"] = 0.0  # callers cannot corrupt the cache
+
+    monkeypatch.setattr(document_processor, "split_sections", MagicMock(side_effect=AssertionError))
+    assert parse_transactions(text)["capital_calls"][0]["amount"] == 5000.0
+
+def test_split_sections_prefilter_and_bound(monkeypatch):
+    assert split_sections("Fund Name: Test Fund\nNo transactions reported") == {}
+    monkeypatch.setattr(document_processor, "MAX_SECTION_CHARS", 50)
+    text = (
+        "Capital Calls\nDate Call Number Amount Description\n"
+        "2024-01-01 Call 1 $100,000 Initial investment\n2024-02-01 Call 2 $250,000 Follow-on"
+    )
+    # The second row crosses the limit and is dropped whole, not cut mid-amount
+    assert split_sections(text)["capital_calls"] == "2024-01-01 Call 1 $100,000 Initial investment"
+    monkeypatch.setattr(document_processor, "MAX_SECTION_CHARS", 20)
+    assert split_sections(text)["capital_calls"] == ""
+
+# ---------- Text Extraction Tests ----------
+
+@pytest.mark.skipif(not SAMPLE_PDF.exists(), reason="sample report not available")
+def test_extract_pdf_text_pdfium(monkeypatch):
+    monkeypatch.setattr(settings, "PDF_TEXT_BACKEND", "pypdfium2")
+    text = extract_pdf_text(str(SAMPLE_PDF))
+    assert "\r" not in text
+    assert parse_fund_info(text)["name"] == "Tech Ventures Fund III"
+    assert len(parse_capital_calls(text)) == 4
+
+@pytest.mark.skipif(not SAMPLE_PDF.exists(), reason="sample report not available")
+def test_extract_pdf_text_parallel_matches_serial(monkeypatch):
+    monkeypatch.setattr(settings, "PDF_TEXT_BACKEND", "pypdfium2")
+    serial = extract_pdf_text(str(SAMPLE_PDF))
+
+    monkeypatch.setattr(document_processor, "PARALLEL_EXTRACTION_MIN_PAGES", 1)
+    assert extract_pdf_text(str(SAMPLE_PDF)) == serial
+
+@pytest.mark.skipif(not SAMPLE_PDF.exists(), reason="sample report not available")
+def test_extract_page_range_pdfplumber_windows(monkeypatch):
+    whole = document_processor._extract_page_range(str(SAMPLE_PDF), "pdfplumber", 0, 2)
+    monkeypatch.setattr(document_processor, "PDFPLUMBER_PAGE_WINDOW", 1)
+    assert document_processor._extract_page_range(str(SAMPLE_PDF), "pdfplumber", 0, 2) == whole
+
 # ---------- Integration Test for DocumentProcessor ----------
 
 @pytest.mark.asyncio
-async def test_process_document_success(tmp_path, mock_db, mock_embedding_func):
+async def test_process_document_success(tmp_path, mock_db, mock_embedding_func, monkeypatch):
     # Buat PDF dummy (simulasi file yang bisa dibaca pdfplumber)
     pdf_path = tmp_path / "dummy.pdf"
     pdf_path.write_text("""
@@ -117,6 +219,7 @@ async def test_process_document_success(tmp_path, mock_db, mock_embedding_func):
     processor = DocumentProcessor(mock_db, mock_embedding_func)
 
     # Patch pdfplumber.open agar tidak benar-benar baca file PDF
+    monkeypatch.setattr(settings, "PDF_TEXT_BACKEND", "pdfplumber")
     import pdfplumber
     pdfplumber.open = MagicMock(return_value=MagicMock(
         __enter__=lambda self: self,
@@ -136,10 +239,103 @@ async def test_process_document_success(tmp_path, mock_db, mock_embedding_func):
     mock_db.commit.assert_called_once()
 
 @pytest.mark.asyncio
-async def test_process_document_failure(mock_db, mock_embedding_func):
+async def test_process_document_retrieves_parse_error_when_save_fails(mock_db, mock_embedding_func, monkeypatch, caplog):
+    monkeypatch.setattr(document_processor, "extract_pdf_text", lambda path: "Capital Calls")
+    monkeypatch.setattr(document_processor, "parse_transactions", MagicMock(side_effect=ValueError("bad rows")))
+    processor = DocumentProcessor(mock_db, mock_embedding_func)
+    processor._save_document = MagicMock(side_effect=RuntimeError("save failed"))
+
+    result = await processor.process_document("dummy.pdf", 1, 1)
+
+    assert result["status"] == "failed"
+    assert result["error"] == "save failed"
+    assert "Transaction parsing failed: bad rows" in caplog.text
+    mock_db.rollback.assert_called_once()
+
+def test_embed_chunks_batches_langchain_embedder(mock_db):
+    embedder = MagicMock()
+    embedder.embed_documents.return_value = [[0.1], [0.2]]
+    processor = DocumentProcessor(mock_db, embedder)
+
+    assert processor._embed_chunks(["a", "b"]) == [[0.1], [0.2]]
+    embedder.embed_documents.assert_called_once_with(["a", "b"])
+    embedder.assert_not_called()
+
+def test_embed_chunks_falls_back_to_per_chunk_callable(mock_db, mock_embedding_func):
+    processor = DocumentProcessor(mock_db, mock_embedding_func)
+    assert processor._embed_chunks(["a", "b"]) == [[0.1, 0.2, 0.3], [0.1, 0.2, 0.3]]
+
+def test_copy_embedding_rows_streams_binary_on_psycopg2(mock_db, mock_embedding_func):
+    mock_db.get_bind.return_value.dialect.driver = "psycopg2"
+    cursor = mock_db.connection.return_value.connection.cursor.return_value.__enter__.return_value
+    processor = DocumentProcessor(mock_db, mock_embedding_func)
+    rows = [{
+        "doc_id": 1, "content": "hi", "content_hash": b"\x01\xff",
+        "embedding": np.array([0.5, 1.0], dtype=np.float16)
+    }]
+    assert processor._copy_embedding_rows(rows) is True
+    sql, buffer = cursor.copy_expert.call_args.args
+    assert sql.startswith("COPY document_embeddings")
+    assert buffer.getvalue() == (
+        b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8
+        + b"\x00\x04" + b"\x00\x00\x00\x04\x00\x00\x00\x01"
+        + b"\x00\x00\x00\x02hi"
+        + b"\x00\x00\x00\x02\x01\xff"
+        + b"\x00\x00\x00\x08\x00\x02\x00\x00\x38\x00\x3c\x00"
+        + b"\xff\xff"
+    )
+
+def test_cached_embeddings_maps_stored_hashes(mock_db, mock_embedding_func):
+    content_hash = document_processor._chunk_hash("model", "chunk")
+    mock_db.execute.return_value.fetchall.return_value = [(memoryview(content_hash), [0.5, 1.0])]
+    processor = DocumentProcessor(mock_db, mock_embedding_func)
+    cached = processor._cached_embeddings([content_hash, content_hash])
+    assert list(cached) == [content_hash]
+    assert cached[content_hash].dtype == np.float16
+    assert cached[content_hash].tolist() == [0.5, 1.0]
+    assert mock_db.execute.call_args.args[1] == {"hashes": [content_hash]}
+    assert processor._cached_embeddings([]) == {}
+
+def test_chunk_hash_is_keyed_by_model():
+    assert document_processor._chunk_hash("a", "chunk") != document_processor._chunk_hash("b", "chunk")
+
+def test_save_chunk_embeddings_reuses_only_same_model(mock_db):
+    embedder = MagicMock(model_name="model-a")
+    embedder.embed_documents.return_value = [[0.5, 1.0]]
+    mock_db.get_bind.return_value.dialect.driver = "pysqlite"
+    processor = DocumentProcessor(mock_db, embedder)
+    processor._save_chunk_embeddings(1, ["chunk"])
+    lookup_params = mock_db.execute.call_args_list[0].args[1]
+    assert lookup_params == {"hashes": [document_processor._chunk_hash("model-a", "chunk")]}
+
+def test_save_chunk_embeddings_never_reuses_plain_callables(mock_db, mock_embedding_func):
+    # e.g. the upload endpoint's placeholder embedder: no lookup, and no hash stored
+    mock_db.get_bind.return_value.dialect.driver = "pysqlite"
+    processor = DocumentProcessor(mock_db, mock_embedding_func)
+    assert processor.embedding_model is None
+    processor._save_chunk_embeddings(1, ["chunk"])
+    mock_db.execute.assert_called_once()
+    rows = mock_db.execute.call_args.args[1]
+    assert rows[0]["content_hash"] is None
+
+def test_pgcopy_embedding_row_writes_null_hash():
+    row = document_processor._pgcopy_embedding_row(1, "", None, np.array([1.0], dtype=np.float16))
+    assert row[10:18] == b"\x00\x00\x00\x00\xff\xff\xff\xff"
+
+def test_format_halfvec_rounds_to_float16():
+    assert document_processor._format_halfvec([0.1, -2.0, 1 / 3]) == "[0.1,-2.0,0.3333]"
+
+def test_copy_embedding_rows_skips_other_drivers(mock_db, mock_embedding_func):
+    mock_db.get_bind.return_value.dialect.driver = "pysqlite"
+    processor = DocumentProcessor(mock_db, mock_embedding_func)
+    assert processor._copy_embedding_rows([]) is False
+
+@pytest.mark.asyncio
+async def test_process_document_failure(mock_db, mock_embedding_func, monkeypatch):
     processor = DocumentProcessor(mock_db, mock_embedding_func)
 
     # PDF kosong (simulasi error)
+    monkeypatch.setattr(settings, "PDF_TEXT_BACKEND", "pdfplumber")
     import pdfplumber
     pdfplumber.open = MagicMock(return_value=MagicMock(
         __enter__=lambda self: self,
@@ -1,9 +1,11 @@
 import pytest
 from unittest.mock import MagicMock
 from decimal import Decimal
+from datetime import datetime
 import numpy as np
 from types import SimpleNamespace
-from app.services.metrics_calculator import MetricsCalculator
+from app.services import metrics_calculator
+from app.services.metrics_calculator import MetricsCalculator, irr_newton
 
 
 @pytest.fixture
@@ -18,16 +20,35 @@ def calculator(mock_db):
     return MetricsCalculator(db=mock_db)
 
 
+def mock_totals(mock_db, calls=0.0, adjustments=0.0, nav=0.0, distributions=0.0):
+    """Row of the single aggregate query"""
+    mock_db.execute.return_value.one.return_value._mapping = {
+        "total_calls": calls, "total_adjustments": adjustments,
+        "nav": nav, "total_distributions": distributions,
+    }
+
+
 def test_calculate_pic(calculator, mock_db):
-    mock_db.query().filter().scalar.side_effect = [Decimal("100000"), Decimal("20000")]  # total_calls, total_adjustments
+    mock_totals(mock_db, calls=100000.0, adjustments=20000.0)
     result = calculator.calculate_pic(1)
-    assert result == Decimal("80000")
+    assert result == 80000.0
+    # The statement is built once at import; only the fund id is bound per call
+    mock_db.execute.assert_called_once_with(metrics_calculator._AGGREGATES, {"fund_id": 1})
+
+
+def test_ratios_reuse_memoized_totals(calculator, mock_db):
+    # Every total comes from one aggregate query, shared by all the ratios
+    mock_totals(mock_db, calls=100000.0, distributions=50000.0, nav=25000.0)
+    assert calculator.calculate_dpi(1) == 0.5
+    assert calculator.calculate_rvpi(1) == 0.25
+    assert calculator.calculate_tvpi(1) == 0.75
+    mock_db.execute.assert_called_once()
 
 
 def test_calculate_total_distributions(calculator, mock_db):
-    mock_db.query().filter().scalar.return_value = Decimal("50000")
+    mock_totals(mock_db, distributions=50000.0)
     result = calculator.calculate_total_distributions(1)
-    assert result == Decimal("50000")
+    assert result == 50000.0
 
 
 def test_calculate_dpi(calculator, mock_db):
@@ -40,12 +61,8 @@ def test_calculate_dpi(calculator, mock_db):
 
 def test_calculate_irr_basic(calculator, mock_db, monkeypatch):
     """Test IRR calculation with fake cashflows"""
-    fake_flows = [
-        {"amount": -100000, "date": "2023-01-01"},
-        {"amount": 60000, "date": "2024-01-01"},
-        {"amount": 60000, "date": "2025-01-01"},
-    ]
-    calculator._get_cash_flows = MagicMock(return_value=fake_flows)
+    fake_amounts = np.array([-100000.0, 60000.0, 60000.0])
+    calculator._get_cash_flow_amounts = MagicMock(return_value=fake_amounts)
 
     irr = calculator.calculate_irr(1)
     assert irr is not None
@@ -53,8 +70,17 @@ def test_calculate_irr_basic(calculator, mock_db, monkeypatch):
     assert irr > 0  # should be positive IRR
 
 
+def test_irr_newton_matches_numpy_financial():
+    import numpy_financial as npf
+    flows = [-100000, -20000, 0, 30000, 60000, 45000]
+    assert irr_newton(flows) == pytest.approx(npf.irr(flows), abs=1e-9)
+    assert irr_newton([-1000, 1000]) == pytest.approx(0.0)
+    assert irr_newton([1000, 1000]) is None  # no sign change, no root
+    assert irr_newton([-1000, 3000, -2100]) is None  # several sign changes, left to npf.irr
+
+
 def test_calculate_nav(calculator, mock_db):
-    mock_db.query().filter().scalar.return_value = Decimal("120000")
+    mock_totals(mock_db, nav=120000.0)
     result = calculator.calculate_nav(1)
     assert result == 120000.0
 
@@ -75,50 +101,74 @@ def test_calculate_tvpi(calculator):
 
 
 def test_calculate_all_metrics(calculator):
-    calculator.calculate_pic = MagicMock(return_value=Decimal("100000"))
-    calculator.calculate_total_distributions = MagicMock(return_value=Decimal("50000"))
-    calculator.calculate_dpi = MagicMock(return_value=0.5)
+    calculator._fetch_aggregates = MagicMock(return_value={
+        "total_calls": 120000.0,
+        "total_adjustments": 20000.0,
+        "nav": 50000.0,
+        "total_distributions": 50000.0,
+    })
     calculator.calculate_irr = MagicMock(return_value=15.25)
-    calculator.calculate_nav = MagicMock(return_value=50000)
-    calculator.calculate_rvpi = MagicMock(return_value=0.5)
-    calculator.calculate_tvpi = MagicMock(return_value=1.0)
 
     result = calculator.calculate_all_metrics(1)
     assert set(result.keys()) == {
         "pic", "total_distributions", "dpi", "irr", "tvpi", "rvpi", "nav"
     }
+    assert result["pic"] == 100000.0
     assert result["dpi"] == 0.5
+    assert result["rvpi"] == 0.5
+    assert result["tvpi"] == 1.0
     assert result["irr"] == 15.25
+    calculator._fetch_aggregates.assert_called_once_with(1)
+
+def test_fetch_aggregates_single_query(calculator, mock_db):
+    mock_db.execute.return_value.one.return_value._mapping = {
+        "total_calls": 100000.0, "total_adjustments": 0.0,
+        "nav": 0.0, "total_distributions": 5000.0,
+    }
+    totals = calculator._fetch_aggregates(1)
+    assert totals["total_calls"] == 100000.0
+    assert totals["nav"] == 0.0
+    mock_db.execute.assert_called_once_with(metrics_calculator._AGGREGATES, {"fund_id": 1})
+    mock_db.query.assert_not_called()
 
 def test_get_cash_flows(calculator, mock_db):
     """Test _get_cash_flows() returns correctly sorted list"""
-    # Mock capital calls
-    mock_calls = [
-        SimpleNamespace(call_date="2023-01-01", amount=Decimal("100000")),
-        SimpleNamespace(call_date="2023-03-01", amount=Decimal("50000")),
+    # One UNION ALL query, ordered by date in SQL
+    mock_db.execute.return_value.all.return_value = [
+        SimpleNamespace(date="2023-01-01", amount=-100000.0, type="capital_call"),
+        SimpleNamespace(date="2023-02-01", amount=30000.0, type="distribution"),
+        SimpleNamespace(date="2023-03-01", amount=-50000.0, type="capital_call"),
+        SimpleNamespace(date="2023-04-01", amount=40000.0, type="distribution"),
     ]
-    # Mock distributions
-    mock_dists = [
-        SimpleNamespace(distribution_date="2023-02-01", amount=Decimal("30000")),
-        SimpleNamespace(distribution_date="2023-04-01", amount=Decimal("40000")),
-    ]
-
-    mock_db.query().filter().order_by().all.side_effect = [mock_calls, mock_dists]
 
     result = calculator._get_cash_flows(1)
 
     assert len(result) == 4
     assert result[0]["amount"] == -100000.0  # capital call → negatif
     assert result[-1]["amount"] == 40000.0   # distribution → positif
+    mock_db.execute.assert_called_once()
 
-def test_calculate_irr_invalid(calculator):
+def test_get_cash_flow_amounts(calculator, mock_db):
+    # Monthly net flows from SQL; months without flows are filled with 0
+    mock_db.execute.return_value.all.return_value = [
+        (datetime(2023, 11, 1), -100000.0), (datetime(2024, 2, 1), 30000.0)
+    ]
+    amounts = calculator._get_cash_flow_amounts(1)
+    assert amounts.dtype == np.float64
+    assert amounts.tolist() == [-100000.0, 0.0, 0.0, 30000.0]
+
+    mock_db.execute.return_value.all.return_value = []
+    assert calculator._get_cash_flow_amounts(1).size == 0
+
+def test_calculate_irr_invalid(calculator, monkeypatch):
     """Test IRR returns None for invalid or empty cashflows"""
-    calculator._get_cash_flows = MagicMock(return_value=[{"amount": -1000}])  # cuma 1 cashflow
+    calculator._get_cash_flow_amounts = MagicMock(return_value=np.array([-1000.0]))  # cuma 1 cashflow
     result = calculator.calculate_irr(1)
     assert result is None
 
-    # Case invalid IRR (np.irr returns NaN)
-    calculator._get_cash_flows = MagicMock(return_value=[{"amount": -1000}, {"amount": 1000}])
+    # Case invalid IRR (Newton does not converge, np.irr returns NaN)
+    monkeypatch.setattr(metrics_calculator, "irr_newton", MagicMock(return_value=None))
+    calculator._get_cash_flow_amounts = MagicMock(return_value=np.array([-1000.0, 1000.0]))
     import numpy_financial as npf
     npf.irr = MagicMock(return_value=np.nan)
     result = calculator.calculate_irr(1)
@@ -131,19 +181,21 @@ def test_get_calculation_breakdown_dpi(calculator, mock_db):
     calculator.calculate_total_distributions = MagicMock(return_value=Decimal("50000"))
     calculator.calculate_dpi = MagicMock(return_value=0.5)
 
-    # Mock queries untuk capital_calls, distributions, adjustments
-    fake_call = SimpleNamespace(call_date="2023-01-01", amount=Decimal("100000"), description="Initial call")
-    fake_dist = SimpleNamespace(distribution_date="2023-06-01", amount=Decimal("50000"), is_recallable=False, description="Payout")
-    fake_adj = SimpleNamespace(adjustment_date="2023-03-01", amount=Decimal("0"), adjustment_type="NAV_ADJUSTMENT", description="None")
+    # Transactions come back from one UNION ALL query
+    calculator._load_totals = MagicMock()
+    fake_call = SimpleNamespace(kind="capital_calls", date="2023-01-01", amount=Decimal("100000"), description="Initial call", is_recallable=None, adjustment_type=None)
+    fake_adj = SimpleNamespace(kind="adjustments", date="2023-03-01", amount=Decimal("0"), description="None", is_recallable=None, adjustment_type="NAV_ADJUSTMENT")
+    fake_dist = SimpleNamespace(kind="distributions", date="2023-06-01", amount=Decimal("50000"), description="Payout", is_recallable=False, adjustment_type=None)
 
-    mock_db.query().filter().order_by().all.side_effect = [
-        [fake_call], [fake_dist], [fake_adj]
-    ]
+    mock_db.execute.return_value.all.return_value = [fake_call, fake_adj, fake_dist]
 
     result = calculator.get_calculation_breakdown(1, "dpi")
     assert "formula" in result
     assert result["metric"] == "DPI"
     assert "transactions" in result
+    assert result["transactions"]["distributions"][0]["date"] == "2023-06-01"
+    assert result["transactions"]["adjustments"][0]["type"] == "NAV_ADJUSTMENT"
+    mock_db.execute.assert_called_once()
 
 
 def test_get_calculation_breakdown_irr(calculator):
@@ -162,10 +214,10 @@ def test_get_calculation_breakdown_irr(calculator):
 
 def test_get_calculation_breakdown_pic(calculator, mock_db):
     """Test PIC breakdown"""
-    fake_call = SimpleNamespace(call_date="2023-01-01", amount=Decimal("100000"), description="Call 1")
-    fake_adj = SimpleNamespace(adjustment_date="2023-02-01", amount=Decimal("10000"), adjustment_type="NAV_ADJUSTMENT", description="Adj 1")
+    fake_call = SimpleNamespace(kind="capital_calls", date="2023-01-01", amount=Decimal("100000"), description="Call 1", is_recallable=None, adjustment_type=None)
+    fake_adj = SimpleNamespace(kind="adjustments", date="2023-02-01", amount=Decimal("10000"), description="Adj 1", is_recallable=None, adjustment_type="NAV_ADJUSTMENT")
 
-    mock_db.query().filter().order_by().all.side_effect = [[fake_call], [fake_adj]]
+    mock_db.execute.return_value.all.return_value = [fake_call, fake_adj]
     calculator.calculate_pic = MagicMock(return_value=Decimal("90000"))
 
     result = calculator.get_calculation_breakdown(1, "pic")
@@ -181,19 +233,17 @@ def test_get_calculation_breakdown_unknown(calculator):
 
 def test_calculate_nav_exception(calculator, mock_db):
     """Should return None when DB query fails"""
-    mock_db.query.side_effect = Exception("DB Error")
+    mock_db.execute.side_effect = Exception("DB Error")
     result = calculator.calculate_nav(1)
     assert result is None
 
 
 def test_calculate_pic_zero_calls(calculator, mock_db):
     """Should return 0 if no capital calls (division by zero safe)"""
-    mock_query = mock_db.query.return_value
-    mock_filter = mock_query.filter.return_value
-    mock_filter.scalar.side_effect = [Decimal(0), Decimal(0)]  # total_calls, total_adjustments
+    mock_totals(mock_db, calls=0.0, adjustments=0.0)
     
     result = calculator.calculate_pic(1)
-    assert result == Decimal(0)
+    assert result == 0.0
 
 
 def test_calculate_dpi_division_by_zero(calculator, mock_db):
@@ -204,9 +254,18 @@ def test_calculate_dpi_division_by_zero(calculator, mock_db):
     assert result == 0 or result == 0.0
 
 
-def test_calculate_irr_raises_exception(calculator):
+def test_calculate_irr_without_sign_change_skips_solver(calculator, monkeypatch):
+    solver = MagicMock()
+    monkeypatch.setattr(metrics_calculator, "irr_newton", solver)
+    calculator._get_cash_flow_amounts = MagicMock(return_value=np.array([-1000.0, -500.0]))
+    assert calculator.calculate_irr(1) is None
+    solver.assert_not_called()
+
+
+def test_calculate_irr_raises_exception(calculator, monkeypatch):
     """Should return None if np.irr raises exception"""
-    calculator._get_cash_flows = MagicMock(return_value=[{"amount": -1000}, {"amount": 1000}])
+    monkeypatch.setattr(metrics_calculator, "irr_newton", MagicMock(return_value=None))
+    calculator._get_cash_flow_amounts = MagicMock(return_value=np.array([-1000.0, 1000.0]))
     import numpy_financial as npf
     npf.irr = MagicMock(side_effect=Exception("Invalid IRR"))
     result = calculator.calculate_irr(1)
@@ -217,4 +276,11 @@ def test_get_calculation_breakdown_unknown_metric(calculator):
     """Should return error dict for unknown metric"""
     result = calculator.get_calculation_breakdown(1, "random_metric")
     assert "error" in result
-    assert "Unknown metric" in result["error"]
\ No newline at end of file
+    assert "Unknown metric" in result["error"]
+
+def test_calculate_irr_annualizes_monthly_rate(calculator):
+    # 10% over twelve months of monthly buckets
+    calculator._get_cash_flow_amounts = MagicMock(
+        return_value=np.array([-1000.0] + [0.0] * 11 + [1100.0])
+    )
+    assert calculator.calculate_irr(1) == 10.0
@@ -8,6 +8,7 @@ from app.services.rag_engine import RAGEngine, CHUNK_SIZE, CHUNK_OVERLAP
 def mock_vector_store():
     store = AsyncMock()
     store.add_document = AsyncMock()
+    store.add_documents = AsyncMock()
     store.similarity_search = AsyncMock(return_value=[
         {"content": "Fund performance summary", "metadata": {"fund_id": 1}, "score": 0.9},
         {"content": "IRR details", "metadata": {"fund_id": 1}, "score": 0.85},
@@ -34,15 +35,27 @@ def test_chunk_text_short(rag_engine):
     chunks = rag_engine.chunk_text(text)
     assert chunks == ["Hello World"]
 
+
+def test_chunk_text_skips_overlap_only_tail(rag_engine):
+    # The text ends inside the first chunk's overlap window: no second chunk is needed
+    text = "".join(chr(ord("a") + i % 26) for i in range(CHUNK_SIZE - CHUNK_OVERLAP + 10))
+    assert rag_engine.chunk_text(text) == [text]
+    assert rag_engine.chunk_text("") == []
+
+    text = "x" * (CHUNK_SIZE + 1)
+    chunks = rag_engine.chunk_text(text)
+    assert chunks[-1] == text[CHUNK_SIZE - CHUNK_OVERLAP:]
+
 @pytest.mark.asyncio
 async def test_add_document_calls_vector_store(rag_engine, mock_vector_store):
     await rag_engine.add_document(1, 2, "Sample text for fund performance.")
-    assert mock_vector_store.add_document.call_count >= 1
+    mock_vector_store.add_documents.assert_awaited_once()
 
     # Verify metadata attached
-    args, kwargs = mock_vector_store.add_document.call_args
-    assert "fund_id" in args[1]
-    assert args[1]["document_id"] == 1
+    contents, metadatas = mock_vector_store.add_documents.call_args.args
+    assert contents == ["Sample text for fund performance."]
+    assert "fund_id" in metadatas[0]
+    assert metadatas[0]["document_id"] == 1
 
 @pytest.mark.asyncio
 async def test_retrieve_context_with_fund_id(rag_engine, mock_vector_store):
@@ -84,13 +97,16 @@ async def test_add_documents_bulk(rag_engine, mock_vector_store):
 
     await rag_engine.add_documents_bulk(documents)
 
-    # Verify both add_document called
-    assert mock_vector_store.add_document.await_count >= 2
+    # Both documents' chunks go to the vector store in one call
+    mock_vector_store.add_documents.assert_awaited_once()
+    contents, metadatas = mock_vector_store.add_documents.call_args.args
+    assert contents == ["Fund A data", "Fund B data"]
+    assert [m["document_id"] for m in metadatas] == [1, 2]
     
 @pytest.mark.asyncio
 async def test_add_document_with_metadata(monkeypatch):
     mock_vector_store = MagicMock()
-    mock_vector_store.add_document = AsyncMock(return_value=None)
+    mock_vector_store.add_documents = AsyncMock(return_value=None)
 
     engine = RAGEngine(vector_store=mock_vector_store)
 
@@ -104,7 +120,6 @@ async def test_add_document_with_metadata(monkeypatch):
     )
 
     expected_metadata = {"custom": "meta", "document_id": 10, "fund_id": 5}
-    mock_vector_store.add_document.assert_any_call("chunk1", expected_metadata)
-    mock_vector_store.add_document.assert_any_call("chunk2", expected_metadata)
-
-    assert mock_vector_store.add_document.await_count == 2
+    mock_vector_store.add_documents.assert_awaited_once_with(
+        ["chunk1", "chunk2"], [expected_metadata, expected_metadata]
+    )
@@ -71,6 +71,15 @@ def test_validate_table_mixed_data(parser):
     assert result[0][2] == "ABC"
 
 
+def test_validate_table_keeps_text_cells(parser):
+    table = [["Call 1", "$100", "31/02/2024", "-inf", "1/2"]]
+    result = parser.validate_table(table)
+
+    assert result[0][:3] == ["Call 1", "$100", "31/02/2024"]
+    assert result[0][3] == float("-inf")
+    assert result[0][4] == "1/2"
+
+
 @pytest.mark.parametrize("text,expected", [
     ([["Capital Call", "Amount"]], "capital_call"),
     ([["Distribution Summary"]], "distribution"),
@@ -1,9 +1,17 @@
 import pytest
 import numpy as np
 from unittest.mock import MagicMock, patch, AsyncMock
+from app.services import vector_store
 from app.services.vector_store import VectorStore
 
 
+@pytest.fixture(autouse=True)
+def reset_vector_store_state(monkeypatch):
+    """Each test loads its own (mocked) model and runs the DDL check again"""
+    monkeypatch.setattr(vector_store, "_embeddings", None)
+    monkeypatch.setattr(VectorStore, "_extension_ready", False)
+
+
 @pytest.fixture
 def mock_db():
     db = MagicMock()
@@ -24,6 +32,41 @@ def store(mock_db):
         return store
 
 
+def test_model_and_ddl_are_shared_between_instances(mock_db):
+    with patch("app.services.vector_store.HuggingFaceEmbeddings") as MockEmbeddings:
+        first = VectorStore(db=mock_db)
+        ddl_calls = mock_db.execute.call_count
+        second = VectorStore(db=mock_db)
+
+    MockEmbeddings.assert_called_once()
+    assert second.embeddings is first.embeddings
+    assert mock_db.execute.call_count == ddl_calls
+
+
+def test_ensure_extension_runs_each_statement_separately(mock_db):
+    # An index that fails to build must not stop the statements after it
+    def execute(statement, *args):
+        if "hnsw" in statement.text.lower() and "create index" in statement.text.lower():
+            raise Exception("operator class mismatch")
+    mock_db.execute.side_effect = execute
+    with patch("app.services.vector_store.HuggingFaceEmbeddings"):
+        VectorStore(db=mock_db)
+        executed = [call.args[0].text for call in mock_db.execute.call_args_list]
+        VectorStore(db=mock_db)
+
+    assert len(executed) == len(vector_store._SCHEMA_DDL)
+    assert mock_db.commit.call_count == len(vector_store._SCHEMA_DDL) - 1
+    mock_db.rollback.assert_called_once()
+    # content_hash is added before any index; the column is migrated before the HNSW index
+    add_column = next(i for i, sql in enumerate(executed) if "ADD COLUMN" in sql)
+    migrate = next(i for i, sql in enumerate(executed) if "ALTER COLUMN embedding" in sql)
+    hnsw = next(i for i, sql in enumerate(executed) if "USING hnsw" in sql)
+    assert add_column < migrate < hnsw
+    assert all("CREATE INDEX" not in sql for sql in executed[:add_column])
+    # Attempted once per process, not on every request
+    assert mock_db.execute.call_count == len(executed)
+
+
 @pytest.mark.asyncio
 async def test_get_embedding_returns_numpy_array(store):
     text = "sample text"
@@ -34,11 +77,94 @@ async def test_get_embedding_returns_numpy_array(store):
     store.embeddings.embed_query.assert_called_once_with(text)
 
 
+@pytest.mark.asyncio
+async def test_get_embedding_caches_repeated_text(store, monkeypatch):
+    monkeypatch.setattr("app.services.vector_store.QUERY_EMBEDDING_CACHE_SIZE", 1)
+    first = await store._get_embedding("cached query")
+    assert await store._get_embedding("cached query") is first
+    store.embeddings.embed_query.assert_called_once_with("cached query")
+
+    await store._get_embedding("other query")  # evicts "cached query"
+    await store._get_embedding("cached query")
+    assert store.embeddings.embed_query.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_add_document_binds_embedding(store, mock_db):
+    store.embeddings.embed_documents.return_value = [[0.5, 1.0]]
+    await store.add_document("content", {"document_id": 1, "fund_id": 2})
+    sql, params = mock_db.execute.call_args.args
+    assert set(sql._bindparams) == {"document_id", "fund_id", "content", "embedding", "metadata"}
+    assert params["embedding"] == "[0.5,1.0]"
+    store.embeddings.embed_documents.assert_called_once_with(["content"])
+    mock_db.commit.assert_called()
+
+
+@pytest.mark.asyncio
+async def test_add_document_bypasses_query_cache(store, monkeypatch):
+    monkeypatch.setattr(vector_store, "_query_embedding_cache", vector_store.OrderedDict())
+    store.embeddings.embed_documents.return_value = [[0.5, 1.0]]
+    await store.add_document("content", {"document_id": 1, "fund_id": 2})
+    assert len(vector_store._query_embedding_cache) == 0
+    store.embeddings.embed_query.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_similarity_search_binds_float16_query(store, mock_db):
+    store.embeddings.embed_query.return_value = [0.1, 1 / 3]
+    await store.similarity_search("float16 query", k=3, filter_metadata={"fund_id": 7})
+    sql, params = mock_db.execute.call_args.args
+    assert "CAST(:query_embedding AS halfvec)" in sql.text
+    assert params == {"k": 3, "query_embedding": "[0.1,0.3333]", "param_fund_id": 7}
+
+
+@pytest.mark.asyncio
+async def test_similarity_search_reuses_statements(store, mock_db):
+    store.embeddings.embed_query.return_value = [0.1, 0.2]
+    await store.similarity_search("first", filter_metadata={"fund_id": 1, "other": 2})
+    first = mock_db.execute.call_args.args[0]
+    await store.similarity_search("second", filter_metadata={"fund_id": 2})
+    assert mock_db.execute.call_args.args[0] is first
+    assert "WHERE fund_id = :param_fund_id" in first.text
+
+
+@pytest.mark.asyncio
+async def test_add_documents_batches_embeddings(store, mock_db, monkeypatch):
+    monkeypatch.setattr("app.services.vector_store.EMBEDDING_BATCH_SIZE", 2)
+    mock_db.get_bind.return_value.dialect.driver = "pysqlite"
+    store.embeddings.embed_documents.side_effect = lambda texts: [[0.5, 1.0]] * len(texts)
+    metadatas = [{"document_id": 1, "fund_id": 2}] * 3
+
+    await store.add_documents(["a", "b", "c"], metadatas)
+
+    assert [c.args[0] for c in store.embeddings.embed_documents.call_args_list] == [["a", "b"], ["c"]]
+    rows = mock_db.execute.call_args.args[1]
+    assert rows == [{
+        "document_id": 1, "fund_id": 2, "content": "c",
+        "embedding": "[0.5,1.0]", "metadata": '{"document_id": 1, "fund_id": 2}'
+    }]
+    store.embeddings.embed_query.assert_not_called()
+    mock_db.commit.assert_called()
+
+
+def test_copy_rows_streams_csv_on_psycopg2(store, mock_db):
+    mock_db.get_bind.return_value.dialect.driver = "psycopg2"
+    cursor = mock_db.connection.return_value.connection.cursor.return_value.__enter__.return_value
+    rows = [{
+        "document_id": 1, "fund_id": None, "content": 'say "hi"',
+        "embedding": "[0.5,1.0]", "metadata": '{"a": 1}'
+    }]
+    assert store._copy_rows(rows) is True
+    sql, buffer = cursor.copy_expert.call_args.args
+    assert sql.startswith("COPY document_embeddings")
+    assert buffer.getvalue() == '1,,"say ""hi""","[0.5,1.0]","{""a"": 1}"\r\n'
+
+
 @pytest.mark.asyncio
 async def test_add_document_failure_rolls_back(store, mock_db):
-    with patch.object(store, "_get_embedding", new=AsyncMock(side_effect=Exception("Embedding failed"))):
-        with pytest.raises(Exception):
-            await store.add_document("content", {"document_id": 1, "fund_id": 1})
+    store.embeddings.embed_documents.side_effect = Exception("Embedding failed")
+    with pytest.raises(Exception):
+        await store.add_document("content", {"document_id": 1, "fund_id": 1})
 
     mock_db.rollback.assert_called_once()
 
@@ -65,7 +191,8 @@ async def test_ensure_extension_error_handling(mock_db):
 async def test_add_document_exception(mock_db):
     vs = VectorStore(db=mock_db)
     # Mock embedding generation
-    vs._get_embedding = MagicMock(return_value=np.array([0.1, 0.2, 0.3]))
+    vs.embeddings = MagicMock()
+    vs.embeddings.embed_documents.return_value = [[0.1, 0.2, 0.3]]
     # Force DB execute to raise exception
     mock_db.execute.side_effect = Exception("Insert error")
     with pytest.raises(Exception):
@@ -95,7 +222,8 @@ def test_ensure_extension_exception(mock_db):
 @pytest.mark.asyncio
 async def test_add_document_raises_exception(mock_db):
     vs = VectorStore(db=mock_db)
-    vs._get_embedding = MagicMock(return_value=np.array([0.1, 0.2, 0.3]))
+    vs.embeddings = MagicMock()
+    vs.embeddings.embed_documents.return_value = [[0.1, 0.2, 0.3]]
     mock_db.execute.side_effect = Exception("insert fail")
 
     with pytest.raises(Exception):